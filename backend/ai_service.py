@@ -3,43 +3,43 @@ AI Service for Financial Insights
 ai_service.py
 """
 
-import os
-from typing import List, Dict, Any
-from anthropic import Anthropic
+import json
+from typing import List, Dict, Any, Optional, Union
 import pandas as pd
 from datetime import datetime
 
-class FinancialAIService:
-    """Service for AI-powered financial insights using Claude"""
+from llm_client import (
+    LLMDeadlineExceeded, LLMError, LLMTimeoutError, ResilientLLMClient, client_from_env
+)
+
+# Upper bound on model <-> tool round trips in chat_with_tools
+MAX_TOOL_ROUNDS = 6
+
+
+def generate_context(transactions: Union[List[Dict], pd.DataFrame]) -> str:
+    """
+    Create context summary from transaction data, shared by all providers
     
-    def __init__(self, api_key: str = None):
-        """Initialize with Anthropic API key"""
-        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
-        if not self.api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in environment")
-        
-        self.client = Anthropic(api_key=self.api_key)
-        self.model = "claude-sonnet-4-20250514"
+    Accepts a DataFrame (e.g. the store's frame, which is left unmodified)
+    or a list of transaction dicts.
+    """
+    if len(transactions) == 0:
+        return "No transaction data available."
     
-    def generate_context_from_transactions(self, transactions: List[Dict]) -> str:
-        """Create context summary from transaction data"""
-        if not transactions:
-            return "No transaction data available."
-        
-        df = pd.DataFrame(transactions)
-        df['date'] = pd.to_datetime(df['date'])
-        df['amount'] = pd.to_numeric(df['amount'])
-        
-        # Calculate key metrics
-        total_spending = df['amount'].sum()
-        avg_transaction = df['amount'].mean()
-        category_totals = df.groupby('category')['amount'].sum().to_dict()
-        
-        # Get date range
-        date_range = f"{df['date'].min().strftime('%Y-%m-%d')} to {df['date'].max().strftime('%Y-%m-%d')}"
-        
-        # Format context
-        context = f"""Financial Data Summary:
+    df = transactions if isinstance(transactions, pd.DataFrame) else pd.DataFrame(transactions)
+    dates = pd.to_datetime(df['date'])
+    amounts = pd.to_numeric(df['amount'])
+    
+    # Calculate key metrics
+    total_spending = amounts.sum()
+    avg_transaction = amounts.mean()
+    category_totals = amounts.groupby(df['category'], observed=True).sum().to_dict()
+    
+    # Get date range
+    date_range = f"{dates.min().strftime('%Y-%m-%d')} to {dates.max().strftime('%Y-%m-%d')}"
+    
+    # Format context
+    context = f"""Financial Data Summary:
 - Total transactions: {len(df)}
 - Date range: {date_range}
 - Total spending: ${total_spending:.2f}
@@ -48,26 +48,71 @@ class FinancialAIService:
 
 Spending by Category:
 """
-        for category, amount in sorted(category_totals.items(), key=lambda x: x[1], reverse=True):
-            percentage = (amount / total_spending) * 100
-            context += f"  - {category}: ${amount:.2f} ({percentage:.1f}%)\n"
-        
-        # Recent transactions
-        recent = df.nlargest(5, 'amount')
-        context += "\nTop 5 Largest Transactions:\n"
-        for _, row in recent.iterrows():
-            context += f"  - {row['date'].strftime('%Y-%m-%d')}: {row['description']} - ${row['amount']:.2f} ({row['category']})\n"
-        
-        return context
+    for category, amount in sorted(category_totals.items(), key=lambda x: x[1], reverse=True):
+        percentage = (amount / total_spending) * 100
+        context += f"  - {category}: ${amount:.2f} ({percentage:.1f}%)\n"
     
-    def chat(self, user_query: str, transactions: List[Dict], 
+    # Recent transactions
+    context += "\nTop 5 Largest Transactions:\n"
+    for index in amounts.nlargest(5).index:
+        context += (f"  - {dates[index].strftime('%Y-%m-%d')}: {df.at[index, 'description']}"
+                    f" - ${amounts[index]:.2f} ({df.at[index, 'category']})\n")
+    
+    return context
+
+
+def _error_type(error: Exception) -> str:
+    """Classify a failed call for the API layer: timeout, unavailable, upstream or error"""
+    if isinstance(error, (LLMTimeoutError, LLMDeadlineExceeded)):
+        return "timeout"
+    if isinstance(error, LLMError):
+        return "unavailable" if error.retryable else "upstream"
+    return "error"
+
+
+def _error_result(error: Exception) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "response": f"Error communicating with AI: {str(error)}",
+        "error": str(error),
+        "error_type": _error_type(error)
+    }
+
+
+class FinancialAIService:
+    """Service for AI-powered financial insights using Claude, falling back to GPT"""
+    
+    # Provider that `api_key` belongs to; failover order comes from
+    # LLM_PROVIDERS unless provider_order is set
+    primary_provider = "anthropic"
+    provider_order: Optional[List[str]] = None
+    
+    def __init__(self, api_key: str = None, llm: ResilientLLMClient = None):
+        """
+        Initialize with an API key for the primary provider; keys for the
+        other providers come from the environment
+        """
+        if llm is None:
+            api_keys = {self.primary_provider: api_key} if api_key else None
+            llm = client_from_env(self.provider_order, api_keys)
+        self.llm = llm
+    
+    @property
+    def model(self) -> str:
+        return self.llm.model
+    
+    def generate_context_from_transactions(self, transactions: Union[List[Dict], pd.DataFrame]) -> str:
+        """Create context summary from transaction data"""
+        return generate_context(transactions)
+    
+    def chat(self, user_query: str, transactions: Union[List[Dict], pd.DataFrame], 
              conversation_history: List[Dict] = None) -> Dict[str, Any]:
         """
-        Chat with Claude about financial data
+        Chat with the model about financial data
         
         Args:
             user_query: User's question
-            transactions: List of transaction dictionaries
+            transactions: List of transaction dictionaries or a DataFrame
             conversation_history: Previous messages in conversation
         
         Returns:
@@ -105,37 +150,125 @@ Guidelines:
         })
         
         try:
-            # Call Claude API
-            response = self.client.messages.create(
-                model=self.model,
+            # Call the LLM (retries, hedging and failover happen in llm_client)
+            response = self.llm.complete(
+                "chat",
                 max_tokens=1024,
                 system=system_prompt,
                 messages=messages
             )
             
             # Extract response text
-            assistant_message = response.content[0].text
+            assistant_message = response.text
             
             return {
                 "success": True,
                 "response": assistant_message,
-                "model": self.model,
+                "model": response.model,
+                "provider": response.provider,
                 "usage": {
-                    "input_tokens": response.usage.input_tokens,
-                    "output_tokens": response.usage.output_tokens
+                    "input_tokens": response.input_tokens,
+                    "output_tokens": response.output_tokens
                 }
             }
         
         except Exception as e:
+            return _error_result(e)
+    
+    def chat_with_tools(self, user_query: str, tools,
+                        conversation_history: List[Dict] = None) -> Dict[str, Any]:
+        """
+        Chat with Claude, letting it query the transactions through tools
+        instead of receiving a pre-built summary
+        
+        Args:
+            user_query: User's question
+            tools: Tool executor exposing `definitions` and `execute(name, arguments)`
+                   (see query_tools.TransactionQueryTools)
+            conversation_history: Previous messages in conversation
+        
+        Returns:
+            Dict with response and metadata (same shape as chat)
+        """
+        
+        system_prompt = """You are a helpful financial advisor AI assistant. You can query the user's financial transaction data with the provided tools.
+
+Guidelines:
+- Use the tools to look up the exact figures needed to answer; never guess numbers
+- Prefer aggregate tools over listing many individual transactions
+- Be conversational and helpful
+- Offer actionable advice
+- If data is insufficient to answer, say so clearly
+- Format currency as USD with 2 decimal places
+"""
+        
+        messages = []
+        if conversation_history:
+            messages.extend(conversation_history)
+        
+        messages.append({
+            "role": "user",
+            "content": user_query
+        })
+        
+        usage = {"input_tokens": 0, "output_tokens": 0}
+        tool_calls = []
+        
+        try:
+            for _ in range(MAX_TOOL_ROUNDS):
+                response = self.llm.complete(
+                    "chat_tools",
+                    max_tokens=1024,
+                    system=system_prompt,
+                    tools=tools.definitions,
+                    messages=messages
+                )
+                usage["input_tokens"] += response.input_tokens
+                usage["output_tokens"] += response.output_tokens
+                
+                if response.stop_reason != "tool_use":
+                    return {
+                        "success": True,
+                        "response": response.text,
+                        "model": response.model,
+                        "provider": response.provider,
+                        "usage": usage,
+                        "tool_calls": tool_calls
+                    }
+                
+                # Run the requested queries locally and send back compact results
+                results = []
+                for block in response.content:
+                    if block.type != "tool_use":
+                        continue
+                    result = tools.execute(block.name, block.input)
+                    tool_calls.append({"name": block.name, "input": block.input})
+                    results.append({
+                        "type": "tool_result",
+                        "tool_use_id": block.id,
+                        "content": json.dumps(result, default=str),
+                        "is_error": "error" in result
+                    })
+                
+                messages.append({"role": "assistant", "content": response.content})
+                messages.append({"role": "user", "content": results})
+            
             return {
                 "success": False,
-                "response": f"Error communicating with AI: {str(e)}",
-                "error": str(e)
+                "response": f"No answer after {MAX_TOOL_ROUNDS} rounds of data queries",
+                "error": "max_tool_rounds"
             }
+        
+        except Exception as e:
+            return _error_result(e)
     
-    def generate_insights_summary(self, transactions: List[Dict]) -> str:
+    def generate_insights_summary(self, transactions: Union[List[Dict], pd.DataFrame],
+                                  raise_errors: bool = False) -> str:
         """
         Generate a natural language summary of financial insights
+        
+        Failures return a fallback message, or raise with raise_errors=True
+        (for callers that must not mistake the fallback for a real summary)
         """
         
         context = self.generate_context_from_transactions(transactions)
@@ -149,18 +282,58 @@ Guidelines:
 Keep it concise (3-4 sentences) and conversational."""
         
         try:
-            response = self.client.messages.create(
-                model=self.model,
+            response = self.llm.complete(
+                "insights_summary",
                 max_tokens=512,
                 system=f"You are a financial advisor. Here's the user's financial data:\n\n{context}",
                 messages=[{"role": "user", "content": prompt}]
             )
             
-            return response.content[0].text
+            return response.text
         
         except Exception as e:
+            if raise_errors:
+                raise
             return f"Unable to generate AI summary: {str(e)}"
     
+    def categorize_merchants(self, merchants: List[str],
+                             categories: List[str]) -> Optional[Dict[str, str]]:
+        """
+        Assign a spending category to each merchant name in one request
+        
+        Returns:
+            Dict of merchant -> category, or None if the call failed
+        """
+        
+        allowed = list(categories) + ["Other"]
+        merchant_list = "\n".join(f"- {merchant}" for merchant in merchants)
+        prompt = f"""Categorize each merchant from a bank statement into exactly one of these categories:
+{", ".join(allowed)}
+
+Merchants:
+{merchant_list}
+
+Respond with only a JSON object mapping each merchant name (exactly as written above) to its category."""
+        
+        try:
+            response = self.llm.complete(
+                "categorize_merchants",
+                max_tokens=20 * len(merchants) + 100,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            
+            text = response.text
+            mapping = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        except Exception:
+            return None
+        
+        known = set(merchants)
+        return {
+            merchant: category
+            for merchant, category in mapping.items()
+            if merchant in known and category in allowed
+        }
+    
     def explain_anomaly(self, transaction: Dict, avg_amount: float, 
                        std_amount: float) -> str:
         """
@@ -178,72 +351,25 @@ Keep it concise (3-4 sentences) and conversational."""
 Explain in one sentence why this is unusual and if it's concerning."""
         
         try:
-            response = self.client.messages.create(
-                model=self.model,
+            response = self.llm.complete(
+                "explain_anomaly",
                 max_tokens=150,
                 messages=[{"role": "user", "content": prompt}]
             )
             
-            return response.content[0].text
+            return response.text
         
         except Exception as e:
             return f"Transaction is {(transaction['amount'] / avg_amount):.1f}x higher than average"
 
 
 # Alternative: OpenAI Integration (if you prefer GPT)
-class FinancialAIServiceOpenAI:
-    """Alternative implementation using OpenAI"""
+class FinancialAIServiceOpenAI(FinancialAIService):
+    """Same service preferring OpenAI GPT, with Claude as the fallback"""
     
-    def __init__(self, api_key: str = None):
-        try:
-            from openai import OpenAI
-        except ImportError:
-            raise ImportError("OpenAI package not installed. Run: pip install openai")
-        
-        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY not found")
-        
-        self.client = OpenAI(api_key=self.api_key)
-        self.model = "gpt-4"
-    
-    def chat(self, user_query: str, transactions: List[Dict],
-             conversation_history: List[Dict] = None) -> Dict[str, Any]:
-        """Chat using OpenAI GPT-4"""
-        
-        # Similar implementation to Claude but using OpenAI format
-        context = self._generate_context(transactions)
-        
-        messages = [
-            {"role": "system", "content": f"You are a financial advisor. User's data:\n{context}"}
-        ]
-        
-        if conversation_history:
-            messages.extend(conversation_history)
-        
-        messages.append({"role": "user", "content": user_query})
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=1024
-            )
-            
-            return {
-                "success": True,
-                "response": response.choices[0].message.content,
-                "model": self.model
-            }
-        
-        except Exception as e:
-            return {
-                "success": False,
-                "response": f"Error: {str(e)}",
-                "error": str(e)
-            }
+    primary_provider = "openai"
+    provider_order = ["openai", "anthropic"]
     
-    def _generate_context(self, transactions: List[Dict]) -> str:
+    def _generate_context(self, transactions: Union[List[Dict], pd.DataFrame]) -> str:
         """Helper to generate context - same as Claude version"""
-        # (Reuse the same logic from FinancialAIService)
-        pass
\ No newline at end of file
+        return generate_context(transactions)
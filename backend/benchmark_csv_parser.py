@@ -0,0 +1,84 @@
+"""
+Benchmark CSV parser backends
+benchmark_csv_parser.py
+
+Measures parse throughput of every installed backend at several thread counts:
+python benchmark_csv_parser.py [rows]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from csv_parser import BACKENDS, DEFAULT_DATE_FORMAT, _normalize_schema, available_backends
+
+
+def generate_csv(rows: int) -> bytes:
+    """Synthetic transactions CSV in the upload format"""
+    rng = np.random.default_rng(42)
+    merchants = np.array([f"MERCHANT {i} #{i % 97}" for i in range(5000)], dtype=object)
+    categories = np.array(["Groceries", "Dining", "Shopping", "Utilities", "Health"], dtype=object)
+    df = pd.DataFrame({
+        "date": (pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, rows), "D")).strftime("%Y-%m-%d"),
+        "description": merchants[rng.integers(0, len(merchants), rows)],
+        "amount": rng.uniform(1, 500, rows).round(2),
+        "category": categories[rng.integers(0, len(categories), rows)],
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def thread_counts():
+    cores = os.cpu_count() or 1
+    counts, n = [], 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    return counts + [cores]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    print("=" * 60)
+    print(f"CSV Parser Benchmark ({rows:,} rows)")
+    print("=" * 60)
+
+    contents = generate_csv(rows)
+    size_mb = len(contents) / 1e6
+    print(f"CSV size: {size_mb:.1f} MB, cores: {os.cpu_count()}")
+    print(f"Backends available: {', '.join(available_backends())}\n")
+
+    reference = None
+    print(f"{'backend':<10}{'threads':>8}{'seconds':>10}{'MB/s':>10}{'rows/s':>14}")
+    for backend in available_backends():
+        # pandas' C engine is single-threaded; polars uses its own fixed pool
+        if backend == "pandas":
+            counts = [1]
+        elif backend == "polars":
+            import polars as pl
+            counts = [pl.thread_pool_size()]
+        else:
+            counts = thread_counts()
+        for threads in counts:
+            # Call the backend directly (parse_transactions_csv would infer
+            # dates in pandas if the backend failed to parse them)
+            start = time.perf_counter()
+            df = BACKENDS[backend](contents, DEFAULT_DATE_FORMAT, threads)
+            elapsed = time.perf_counter() - start
+            assert pd.api.types.is_datetime64_any_dtype(df["date"]), f"{backend} did not parse dates"
+            df = _normalize_schema(df)
+            print(f"{backend:<10}{threads:>8}{elapsed:>10.3f}{size_mb / elapsed:>10.1f}{rows / elapsed:>14,.0f}")
+
+            if reference is None:
+                reference = df
+            else:
+                pd.testing.assert_frame_equal(df, reference)
+
+    print("\n✅ All backends produced identical output")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Rule-based transaction categorization with LLM fallback
+categorizer.py
+"""
+
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+UNCATEGORIZED = "Uncategorized"
+
+# Normalized merchant phrase -> category. Phrases are matched against whole
+# tokens of the normalized description, longest phrase first.
+MERCHANT_RULES: Dict[str, str] = {
+    # Groceries
+    "grocery": "Groceries",
+    "supermarket": "Groceries",
+    "whole foods": "Groceries",
+    "trader joe s": "Groceries",
+    "safeway": "Groceries",
+    "kroger": "Groceries",
+    "aldi": "Groceries",
+    "costco": "Groceries",
+    # Dining
+    "restaurant": "Dining",
+    "coffee": "Dining",
+    "cafe": "Dining",
+    "starbucks": "Dining",
+    "mcdonald s": "Dining",
+    "chipotle": "Dining",
+    "pizza": "Dining",
+    "doordash": "Dining",
+    "uber eats": "Dining",
+    "grubhub": "Dining",
+    # Transportation
+    "gas station": "Transportation",
+    "shell": "Transportation",
+    "chevron": "Transportation",
+    "exxon": "Transportation",
+    "uber": "Transportation",
+    "lyft": "Transportation",
+    "parking": "Transportation",
+    "transit": "Transportation",
+    # Shopping
+    "amazon": "Shopping",
+    "best buy": "Shopping",
+    "walmart": "Shopping",
+    "target": "Shopping",
+    "furniture": "Shopping",
+    "ikea": "Shopping",
+    "electronics": "Shopping",
+    # Entertainment
+    "netflix": "Entertainment",
+    "spotify": "Entertainment",
+    "hulu": "Entertainment",
+    "disney": "Entertainment",
+    "movie": "Entertainment",
+    "cinema": "Entertainment",
+    "steam": "Entertainment",
+    # Health
+    "pharmacy": "Health",
+    "cvs": "Health",
+    "walgreens": "Health",
+    "doctor": "Health",
+    "dental": "Health",
+    "gym": "Health",
+    "fitness": "Health",
+    # Utilities
+    "electric": "Utilities",
+    "water bill": "Utilities",
+    "gas bill": "Utilities",
+    "internet": "Utilities",
+    "comcast": "Utilities",
+    "verizon": "Utilities",
+    "at&t": "Utilities",
+}
+
+# Card processor / payment rail prefixes that precede the actual merchant name
+_PREFIX_PATTERN = r"^(?:(?:pos|debit|purchase|checkcard|sq|tst|paypal|ach)\s+)+"
+
+LLM_BATCH_SIZE = 100
+# Merchant keys per IN (...) query on cache misses
+QUERY_CHUNK_SIZE = 500
+# Pause between LLM batches so uploads waiting in other worker processes
+# get the (unfair) file lock instead of queueing behind every batch
+BATCH_HANDOFF_SECONDS = 0.01
+
+
+def normalize_merchant(descriptions: pd.Series) -> pd.Series:
+    """
+    Reduce raw transaction descriptions to merchant keys
+
+    "POS SQ *Joe's Pizza #1234" -> "joe s pizza"
+    "AMZN Mktp US*2K3LZ8AB1" -> "amzn mktp us"
+    """
+    keys = descriptions.fillna("").astype(str).str.lower()
+    # Drop whole tokens containing digits (store numbers, dates, per-transaction
+    # reference codes like "p4e28a851d"), not just the digits, so the letters
+    # of a code don't end up in the key
+    keys = keys.str.replace(r"\b\w*\d\w*\b", " ", regex=True)
+    # Then punctuation
+    keys = keys.str.replace(r"[^a-z&]+", " ", regex=True).str.strip()
+    keys = keys.str.replace(_PREFIX_PATTERN, "", regex=True)
+    return keys
+
+
+class MerchantRuleIndex:
+    """Hash index over normalized merchant phrases"""
+
+    def __init__(self, rules: Dict[str, str]):
+        self.rules = {" ".join(phrase.lower().split()): category for phrase, category in rules.items()}
+        self.max_tokens = max((len(phrase.split()) for phrase in self.rules), default=0)
+
+    def match(self, merchant_key: str) -> Optional[str]:
+        """Return the category of the longest (then leftmost) matching phrase"""
+        tokens = merchant_key.split()
+        for size in range(min(self.max_tokens, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                category = self.rules.get(" ".join(tokens[start:start + size]))
+                if category is not None:
+                    return category
+        return None
+
+
+class _TicketLock:
+    """FIFO lock: waiters are served in arrival order, so a thread releasing
+    and re-acquiring in a loop can't starve the others"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def __enter__(self):
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving:
+                self._condition.wait()
+
+    def __exit__(self, *exc_info):
+        with self._condition:
+            self._serving += 1
+            self._condition.notify_all()
+
+
+class MerchantCategoryCache:
+    """
+    Persistent merchant -> category mapping for LLM-categorized merchants
+
+    Backed by the merchant_categories table. Lookups are served from memory
+    and fall back to the table for keys not seen yet, so merchants stored by
+    other worker processes are picked up. Callers hold `miss_lock()` while
+    re-checking a batch of misses, asking the LLM and storing the answers,
+    so each merchant is only ever sent to the LLM once.
+    """
+
+    def __init__(self, session_factory: Callable = None, lock_path: str = None):
+        if session_factory is None:
+            from models import SessionLocal
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+        self._memory: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._miss_lock = _TicketLock()
+        self.lock_path = lock_path or os.path.join(tempfile.gettempdir(), "financial-insights-merchant-categories.lock")
+
+    def _query(self, merchant_keys: List[str]) -> Dict[str, str]:
+        from models import MerchantCategory
+
+        found = {}
+        db = self._session_factory()
+        try:
+            # Chunked to stay under the database's bound parameter limit
+            for start in range(0, len(merchant_keys), QUERY_CHUNK_SIZE):
+                chunk = merchant_keys[start:start + QUERY_CHUNK_SIZE]
+                for row in db.query(MerchantCategory).filter(MerchantCategory.merchant_key.in_(chunk)):
+                    found[row.merchant_key] = row.category
+        finally:
+            db.close()
+        return found
+
+    def get_many(self, merchant_keys: Iterable[str]) -> Dict[str, str]:
+        merchant_keys = list(merchant_keys)
+        with self._lock:
+            found = {key: self._memory[key] for key in merchant_keys if key in self._memory}
+        missing = [key for key in merchant_keys if key not in found]
+        if missing:
+            stored = self._query(missing)
+            with self._lock:
+                self._memory.update(stored)
+            found.update(stored)
+        return found
+
+    @contextmanager
+    def miss_lock(self):
+        """Serialize cache misses across threads and worker processes"""
+        with self._miss_lock:
+            try:
+                import fcntl
+            except ImportError:
+                # No cross-process locking available (Windows)
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def put_many(self, mapping: Dict[str, str], source: str = "llm"):
+        from models import MerchantCategory
+
+        if not mapping:
+            return
+        with self._lock:
+            db = self._session_factory()
+            try:
+                for key, category in mapping.items():
+                    db.merge(MerchantCategory(merchant_key=key, category=category, source=source))
+                db.commit()
+            finally:
+                db.close()
+            self._memory.update(mapping)
+
+
+def _default_ai_service():
+    """FinancialAIService if the AI integration is configured, otherwise None"""
+    try:
+        from ai_service import FinancialAIService
+        return FinancialAIService()
+    except (ImportError, ValueError):
+        return None
+
+
+class MerchantCategorizer:
+    """
+    Categorize transactions at ingest time
+
+    Descriptions are factorized so normalization and rule matching run once
+    per distinct description rather than once per row. Merchants no rule
+    matches are looked up in the persistent cache, and only the remainder is
+    sent to the LLM in batched prompts.
+    """
+
+    def __init__(self, rules: Dict[str, str] = None, cache: MerchantCategoryCache = None,
+                 ai_service_factory: Callable = _default_ai_service):
+        self.index = MerchantRuleIndex(rules or MERCHANT_RULES)
+        self.categories = sorted(set(self.index.rules.values()))
+        self.cache = cache or MerchantCategoryCache()
+        self.ai_service_factory = ai_service_factory
+
+    def categorize(self, descriptions: pd.Series) -> pd.Series:
+        """Return a category for every description (same index as input)"""
+        codes, uniques = pd.factorize(descriptions)
+        merchant_keys = normalize_merchant(pd.Series(uniques, dtype=object)).tolist()
+
+        # Rule matching, once per distinct merchant key
+        key_categories: Dict[str, Optional[str]] = {}
+        for key in merchant_keys:
+            if key not in key_categories:
+                key_categories[key] = self.index.match(key)
+
+        unmatched = [key for key, category in key_categories.items() if category is None and key]
+        if unmatched:
+            resolved = self.cache.get_many(unmatched)
+            missing = [key for key in unmatched if key not in resolved]
+            if missing:
+                resolved.update(self._categorize_with_llm(missing))
+            key_categories.update(resolved)
+
+        # One slot per unique description plus a trailing slot for NaN (code -1)
+        unique_categories = np.array(
+            [key_categories.get(key) or UNCATEGORIZED for key in merchant_keys] + [UNCATEGORIZED],
+            dtype=object,
+        )
+        return pd.Series(unique_categories[codes], index=descriptions.index, name="category")
+
+    def _categorize_with_llm(self, merchant_keys: List[str]) -> Dict[str, str]:
+        ai_service = self.ai_service_factory() if self.ai_service_factory else None
+        if ai_service is None:
+            return {}
+
+        categorized: Dict[str, str] = {}
+        for start in range(0, len(merchant_keys), LLM_BATCH_SIZE):
+            if start:
+                time.sleep(BATCH_HANDOFF_SECONDS)
+            batch = merchant_keys[start:start + LLM_BATCH_SIZE]
+            # Locked per batch, so concurrent uploads (in any worker) only
+            # wait for one LLM call rather than for a whole upload's worth
+            with self.cache.miss_lock():
+                # Another upload or worker may have stored some meanwhile
+                stored = self.cache.get_many(batch)
+                categorized.update(stored)
+                batch = [key for key in batch if key not in stored]
+                if not batch:
+                    continue
+                result = ai_service.categorize_merchants(batch, self.categories)
+                if result is None:
+                    # Failed call: leave uncached so it is retried on a later upload
+                    continue
+                # Cache every merchant in a successful batch, even ones the model
+                # skipped, so no merchant is sent to the LLM twice
+                batch_categories = {key: result.get(key) or "Other" for key in batch}
+                self.cache.put_many(batch_categories)
+            categorized.update(batch_categories)
+        return categorized
@@ -0,0 +1,98 @@
+"""
+Response compression middleware (zstd or gzip)
+compression.py
+"""
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with zstd when the client accepts it and the
+    zstandard package is installed, otherwise with gzip
+
+    Streaming responses are compressed chunk by chunk, so large exports are
+    never buffered in full.
+    """
+
+    def __init__(self, app, minimum_size: int = 1000, gzip_level: int = 6, zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.zstd_level = zstd_level
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and zstandard is not None:
+            if "zstd" in Headers(scope=scope).get("Accept-Encoding", ""):
+                responder = ZstdResponder(self.app, self.minimum_size, self.zstd_level)
+                await responder(scope, receive, send)
+                return
+        await self.gzip(scope, receive, send)
+
+
+class ZstdResponder:
+    """Per-request zstd encoder, mirroring starlette's GZipResponder"""
+
+    def __init__(self, app, minimum_size: int, level: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        self.send = None
+        self.initial_message = {}
+        self.started = False
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_with_zstd)
+
+    def _compress(self, body: bytes, more_body: bool) -> bytes:
+        data = self.compressor.compress(body)
+        if more_body:
+            # Emit a complete block so clients can decode as data arrives
+            return data + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return data + self.compressor.flush()
+
+    async def send_with_zstd(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Hold the headers until the first body chunk shows whether to compress
+            self.initial_message = message
+            self.passthrough = "content-encoding" in Headers(raw=message["headers"])
+            return
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            if self.passthrough or (len(body) < self.minimum_size and not more_body):
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = "zstd"
+            headers.add_vary_header("Accept-Encoding")
+            message["body"] = self._compress(body, more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(message["body"]))
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        if not self.passthrough:
+            message["body"] = self._compress(body, more_body)
+        await self.send(message)
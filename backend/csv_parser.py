@@ -0,0 +1,160 @@
+"""
+Pluggable CSV parsing backends for transaction uploads
+csv_parser.py
+"""
+
+import io
+import os
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Date format tried first; files that don't match fall back to inference
+DEFAULT_DATE_FORMAT = os.getenv("CSV_DATE_FORMAT", "%Y-%m-%d")
+
+# Column types shared by every backend
+STRING_COLUMNS = ['description', 'category']
+FLOAT_COLUMNS = ['amount']
+
+# Preferred order when CSV_PARSER_BACKEND is "auto"
+BACKEND_PREFERENCE = ['pyarrow', 'polars', 'pandas']
+
+
+def _default_threads() -> int:
+    return int(os.getenv("CSV_PARSER_THREADS", 0)) or os.cpu_count() or 1
+
+
+def _parse_pandas(contents: bytes, date_format: Optional[str], threads: int) -> pd.DataFrame:
+    """Single-threaded pandas C engine with explicit dtypes"""
+    dtype = {column: object for column in STRING_COLUMNS + ['date']}
+    dtype.update({column: 'float64' for column in FLOAT_COLUMNS})
+    df = pd.read_csv(io.BytesIO(contents), engine='c', dtype=dtype)
+    if 'date' in df.columns and date_format:
+        try:
+            df['date'] = pd.to_datetime(df['date'], format=date_format)
+        except ValueError:
+            pass  # left as strings for inference
+    return df
+
+
+def _parse_pyarrow(contents: bytes, date_format: Optional[str], threads: int) -> pd.DataFrame:
+    """pyarrow's multi-threaded CSV reader"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv
+
+    pa.set_cpu_count(threads)
+    column_types = {column: pa.string() for column in STRING_COLUMNS + ['date']}
+    column_types.update({column: pa.float64() for column in FLOAT_COLUMNS})
+    table = csv.read_csv(
+        io.BytesIO(contents),
+        read_options=csv.ReadOptions(use_threads=threads > 1),
+        convert_options=csv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+    )
+    if 'date' in table.column_names and date_format:
+        index = table.column_names.index('date')
+        try:
+            dates = pc.strptime(table['date'], format=date_format, unit='ns')
+            table = table.set_column(index, 'date', dates)
+        except pa.ArrowInvalid:
+            pass  # left as strings for inference
+    return table.to_pandas()
+
+
+def _parse_polars(contents: bytes, date_format: Optional[str], threads: int) -> pd.DataFrame:
+    """
+    polars CSV reader (multi-threaded)
+
+    polars sizes its thread pool once per process (POLARS_MAX_THREADS), so
+    `threads` does not apply; newer releases have no per-call setting.
+    """
+    import polars as pl
+
+    df = pl.read_csv(io.BytesIO(contents), infer_schema_length=0)
+    df = df.with_columns([pl.col(column).cast(pl.Float64) for column in FLOAT_COLUMNS if column in df.columns])
+    if 'date' in df.columns and date_format:
+        try:
+            df = df.with_columns(pl.col('date').str.strptime(pl.Datetime('ns'), date_format))
+        except (pl.exceptions.ComputeError, pl.exceptions.InvalidOperationError):
+            pass  # left as strings for inference
+    return df.to_pandas()
+
+
+BACKENDS: Dict[str, Callable] = {
+    'pandas': _parse_pandas,
+    'pyarrow': _parse_pyarrow,
+    'polars': _parse_polars,
+}
+
+
+def available_backends() -> List[str]:
+    """Backends whose libraries are installed, in preference order"""
+    available = []
+    for name in BACKEND_PREFERENCE:
+        if name == 'pandas':
+            available.append(name)
+            continue
+        try:
+            __import__(name)
+            # polars hands data to pandas through pyarrow
+            if name == 'polars':
+                __import__('pyarrow')
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def select_backend(name: Optional[str] = None) -> str:
+    """Resolve a backend name ("auto" picks the fastest installed one)"""
+    name = (name or os.getenv("CSV_PARSER_BACKEND", "auto")).lower()
+    available = available_backends()
+    if name == 'auto':
+        return available[0]
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown CSV parser backend '{name}'. Choose from: {list(BACKENDS)}")
+    if name not in available:
+        raise ValueError(f"CSV parser backend '{name}' is not installed")
+    return name
+
+
+def _normalize_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Give every backend's output the same dtypes"""
+    for column in STRING_COLUMNS:
+        if column in df.columns:
+            # Missing values as NaN, like the pandas reader (arrow gives None)
+            values = df[column].astype(object)
+            df[column] = values.where(values.notna(), np.nan)
+    for column in FLOAT_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('float64')
+    if 'date' in df.columns:
+        df['date'] = df['date'].astype('datetime64[ns]')
+    return df
+
+
+def parse_transactions_csv(contents: bytes, backend: Optional[str] = None,
+                           date_format: Optional[str] = DEFAULT_DATE_FORMAT,
+                           threads: Optional[int] = None) -> pd.DataFrame:
+    """
+    Parse an uploaded transactions CSV into a DataFrame
+
+    Args:
+        contents: Raw UTF-8 CSV bytes
+        backend: 'pandas', 'pyarrow', 'polars' or 'auto' (default from CSV_PARSER_BACKEND)
+        date_format: strptime format of the date column; None infers it
+        threads: Parser threads for pyarrow (default all cores; polars uses
+                 its own process-wide pool)
+
+    Returns:
+        DataFrame with datetime64[ns] dates, float64 amounts and object
+        strings, regardless of backend
+    """
+    parse = BACKENDS[select_backend(backend)]
+    df = parse(contents, date_format, threads or _default_threads())
+    if 'date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['date']):
+        # Dates that don't match the format hint: infer just this column
+        # rather than re-parsing the file
+        df['date'] = pd.to_datetime(df['date'])
+    return _normalize_schema(df)
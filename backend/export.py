@@ -0,0 +1,47 @@
+"""
+Chunked transaction export (NDJSON / CSV)
+export.py
+"""
+
+from typing import Iterator
+
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 10_000
+# Upper bound on client-requested chunk sizes, so one chunk stays small
+MAX_CHUNK_SIZE = 100_000
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+def _chunks(df: pd.DataFrame, chunk_size: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        yield chunk.assign(date=chunk['date'].dt.strftime('%Y-%m-%d'))
+
+
+def iter_ndjson(df: pd.DataFrame, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """One JSON object per line, serialized a chunk of rows at a time"""
+    for chunk in _chunks(df, chunk_size):
+        yield chunk.to_json(orient='records', lines=True).encode('utf-8')
+
+
+def iter_csv(df: pd.DataFrame, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """CSV in the upload format, serialized a chunk of rows at a time"""
+    header = True
+    for chunk in _chunks(df, chunk_size):
+        yield chunk.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+    if header:
+        # No rows: still emit the header line
+        yield df.head(0).to_csv(index=False).encode('utf-8')
+
+
+EXPORTERS = {
+    "ndjson": iter_ndjson,
+    "csv": iter_csv,
+}
@@ -0,0 +1,435 @@
+"""
+Provider-agnostic LLM client with deadlines, retries, hedging and failover
+llm_client.py
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
+DEFAULT_OPENAI_MODEL = "gpt-4"
+
+# Latency samples kept per provider and operation for the hedging delay
+LATENCY_WINDOW = 200
+# Don't hedge until this many calls have been observed
+MIN_HEDGE_SAMPLES = 20
+# A provider that just exhausted its retries is tried last for this long
+PROVIDER_COOLDOWN_SECONDS = 30.0
+
+# Calls run on this pool so the caller can stop waiting at its deadline
+# (the SDKs have no way to abandon a request in flight). Abandoned calls
+# finish in the background, bounded by their own timeout. Each of the
+# server's worker threads (AnyIO's default limit is 40) has at most a
+# primary and a hedged request in flight, hence twice that by default.
+POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "80"))
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="llm")
+
+
+class LLMError(Exception):
+    """An LLM call failed; `retryable` tells whether trying again may help"""
+
+    retryable = False
+    reason = "error"
+
+    def __init__(self, message: str, provider: str = None, retry_after: float = None):
+        super().__init__(message)
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class LLMRateLimitError(LLMError):
+    retryable = True
+    reason = "rate_limited"
+
+
+class LLMUnavailableError(LLMError):
+    """Server errors, overload and connection failures"""
+
+    retryable = True
+    reason = "unavailable"
+
+
+class LLMTimeoutError(LLMError):
+    retryable = True
+    reason = "timeout"
+
+
+class LLMDeadlineExceeded(LLMError):
+    """The overall deadline of a call ran out across retries and providers"""
+
+    reason = "deadline"
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def classify_error(exc: Exception, provider: str) -> LLMError:
+    """
+    Map an SDK exception to an LLMError
+
+    Both the anthropic and openai SDKs raise APIStatusError subclasses with
+    a `status_code`, and APITimeoutError / APIConnectionError for transport
+    failures, so errors are classified by those rather than by SDK class.
+    """
+    if isinstance(exc, LLMError):
+        return exc
+    message = f"{provider}: {exc}"
+    name = type(exc).__name__
+    status = getattr(exc, "status_code", None)
+    if name == "APITimeoutError" or isinstance(exc, TimeoutError):
+        return LLMTimeoutError(message, provider)
+    if name == "APIConnectionError" or isinstance(exc, ConnectionError):
+        return LLMUnavailableError(message, provider)
+    if status == 429:
+        return LLMRateLimitError(message, provider, _retry_after(exc))
+    if status is not None and (status >= 500 or status == 408):
+        # Includes Anthropic's 529 "overloaded"
+        return LLMUnavailableError(message, provider, _retry_after(exc))
+    return LLMError(message, provider)
+
+
+class LLMResponse:
+    """Normalized result of a completion from any provider"""
+
+    def __init__(self, text: str, provider: str, model: str,
+                 input_tokens: int = 0, output_tokens: int = 0,
+                 stop_reason: str = None, content: Any = None):
+        self.text = text
+        self.provider = provider
+        self.model = model
+        self.input_tokens = input_tokens or 0
+        self.output_tokens = output_tokens or 0
+        self.stop_reason = stop_reason
+        # Provider-native content blocks (Anthropic tool use needs them)
+        self.content = content
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        return {"input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+
+
+class AnthropicProvider:
+    """Claude via the Messages API (streamed, to measure time-to-first-token)"""
+
+    name = "anthropic"
+    supports_tools = True
+
+    def __init__(self, api_key: str, model: str = None, base_url: str = None):
+        from anthropic import Anthropic
+
+        # Retries are handled by ResilientLLMClient
+        self.client = Anthropic(api_key=api_key, base_url=base_url, max_retries=0)
+        self.model = model or os.getenv("ANTHROPIC_MODEL", DEFAULT_ANTHROPIC_MODEL)
+
+    def complete(self, operation: str, messages: List[Dict], system: str = None,
+                 max_tokens: int = 1024, tools: List[Dict] = None,
+                 timeout: float = None) -> LLMResponse:
+        kwargs = {"model": self.model, "max_tokens": max_tokens, "messages": messages, "timeout": timeout}
+        if system:
+            kwargs["system"] = system
+        if tools:
+            kwargs["tools"] = tools
+
+        start = time.perf_counter()
+        first_token_at = None
+        with self.client.messages.stream(**kwargs) as stream:
+            for _ in stream.text_stream:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+            message = stream.get_final_message()
+
+        if first_token_at is not None:
+            metrics.llm_time_to_first_token.observe(
+                first_token_at - start, model=self.model, operation=operation
+            )
+        return LLMResponse(
+            text="".join(block.text for block in message.content if block.type == "text"),
+            provider=self.name,
+            model=self.model,
+            input_tokens=message.usage.input_tokens,
+            output_tokens=message.usage.output_tokens,
+            stop_reason=message.stop_reason,
+            content=message.content,
+        )
+
+
+class OpenAIProvider:
+    """GPT via Chat Completions; takes the same Anthropic-style messages"""
+
+    name = "openai"
+    supports_tools = False
+
+    def __init__(self, api_key: str, model: str = None, base_url: str = None):
+        try:
+            from openai import OpenAI
+        except ImportError:
+            raise ImportError("OpenAI package not installed. Run: pip install openai")
+
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.model = model or os.getenv("OPENAI_MODEL", DEFAULT_OPENAI_MODEL)
+
+    def complete(self, operation: str, messages: List[Dict], system: str = None,
+                 max_tokens: int = 1024, tools: List[Dict] = None,
+                 timeout: float = None) -> LLMResponse:
+        if tools:
+            raise LLMError("Tool use is not supported by the OpenAI provider", self.name)
+
+        chat_messages = [{"role": "system", "content": system}] if system else []
+        chat_messages.extend(messages)
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=chat_messages,
+            max_tokens=max_tokens,
+            timeout=timeout,
+        )
+        choice = response.choices[0]
+        usage = response.usage
+        return LLMResponse(
+            text=choice.message.content or "",
+            provider=self.name,
+            model=self.model,
+            input_tokens=usage.prompt_tokens if usage else 0,
+            output_tokens=usage.completion_tokens if usage else 0,
+            stop_reason=choice.finish_reason,
+        )
+
+
+PROVIDERS = {
+    AnthropicProvider.name: (AnthropicProvider, "ANTHROPIC_API_KEY"),
+    OpenAIProvider.name: (OpenAIProvider, "OPENAI_API_KEY"),
+}
+
+
+def _configured_key(env_var: str) -> Optional[str]:
+    key = os.getenv(env_var)
+    # Ignore the placeholder values from .env.example
+    if not key or "your-key-here" in key:
+        return None
+    return key
+
+
+def providers_from_env(order: List[str] = None, api_keys: Dict[str, str] = None) -> List:
+    """
+    Build the providers that have an API key, in failover order
+
+    The order comes from `order`, else LLM_PROVIDERS (comma separated),
+    else Anthropic first. Base URLs follow the SDKs' own ANTHROPIC_BASE_URL
+    and OPENAI_BASE_URL variables.
+    """
+    if order is None:
+        order = [name.strip() for name in os.getenv("LLM_PROVIDERS", "anthropic,openai").split(",") if name.strip()]
+    api_keys = api_keys or {}
+
+    providers = []
+    for name in order:
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown LLM provider '{name}' (expected one of {list(PROVIDERS)})")
+        provider_class, env_var = PROVIDERS[name]
+        api_key = api_keys.get(name) or _configured_key(env_var)
+        if not api_key:
+            continue
+        try:
+            providers.append(provider_class(api_key=api_key))
+        except ImportError as e:
+            logger.warning("Skipping LLM provider %s: %s", name, e)
+    return providers
+
+
+class ResilientLLMClient:
+    """
+    Calls a list of providers in failover order under one deadline
+
+    Each provider is tried with up to `max_retries` retries on rate limits,
+    server errors and timeouts, sleeping with full-jitter exponential backoff
+    (or the server's Retry-After when longer). Each attempt is hedged: if it
+    hasn't finished after the provider's recent p95 latency for the same
+    operation, a duplicate is sent and whichever answers first wins, which
+    trims the slow tail at the cost of a few percent extra calls. When a provider is exhausted (or
+    fails with a non-retryable error) the next one takes over with whatever
+    is left of the deadline, and a provider that ran out of retries is moved
+    to the back of the order for a cooldown period so later calls don't pay
+    for its outage again.
+    """
+
+    def __init__(self, providers: List, deadline: float = None, attempt_timeout: float = None,
+                 max_retries: int = None, base_backoff: float = 0.5, max_backoff: float = 8.0,
+                 hedging: bool = None, hedge_quantile: float = 0.95):
+        if not providers:
+            raise ValueError("No LLM provider configured (set ANTHROPIC_API_KEY or OPENAI_API_KEY)")
+        self.providers = list(providers)
+        self.deadline = deadline if deadline is not None else float(os.getenv("LLM_DEADLINE_SECONDS", "60"))
+        self.attempt_timeout = (attempt_timeout if attempt_timeout is not None
+                                else float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "30")))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        if hedging is None:
+            hedging = os.getenv("LLM_HEDGING", "true").lower() != "false"
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+
+    @property
+    def model(self) -> str:
+        return self.providers[0].model
+
+    def complete(self, operation: str, messages: List[Dict], system: str = None,
+                 max_tokens: int = 1024, tools: List[Dict] = None) -> LLMResponse:
+        """
+        Run one completion, raising an LLMError subclass if every provider
+        failed: LLMDeadlineExceeded / LLMTimeoutError when time ran out,
+        LLMRateLimitError / LLMUnavailableError when providers were down
+        """
+        providers = [p for p in self.providers if p.supports_tools] if tools else self.providers
+        if not providers:
+            raise LLMError("No configured LLM provider supports tool use")
+        # Stable sort: configured order, with cooling-down providers last
+        providers = sorted(providers, key=_cooling_down)
+
+        request = {"messages": messages, "system": system, "max_tokens": max_tokens, "tools": tools}
+        deadline = time.monotonic() + self.deadline
+        error = None
+        for index, provider in enumerate(providers):
+            start = time.perf_counter()
+            try:
+                response = self._call_with_retries(provider, operation, request, deadline)
+            except LLMError as e:
+                error = e
+                if e.retryable:
+                    _start_cooldown(provider)
+                metrics.llm_requests.inc(model=provider.model, operation=operation, outcome=e.reason)
+                if index + 1 < len(providers):
+                    fallback = providers[index + 1]
+                    logger.warning("LLM provider %s failed (%s), failing over to %s", provider.name, e, fallback.name)
+                    metrics.llm_failovers.inc(provider=provider.name, fallback=fallback.name)
+                continue
+
+            metrics.llm_request_duration.observe(
+                time.perf_counter() - start, model=response.model, operation=operation
+            )
+            metrics.llm_requests.inc(model=response.model, operation=operation, outcome="success")
+            return response
+        raise error
+
+    def _call_with_retries(self, provider, operation: str, request: Dict, deadline: float) -> LLMResponse:
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMDeadlineExceeded(f"{provider.name}: deadline of {self.deadline:.1f}s exceeded", provider.name)
+            try:
+                return self._hedged_attempt(provider, operation, request, min(remaining, self.attempt_timeout))
+            except LLMError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                # Full jitter spreads out clients that were throttled together
+                delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                metrics.llm_retries.inc(provider=provider.name, reason=e.reason)
+                time.sleep(delay)
+
+    def _hedged_attempt(self, provider, operation: str, request: Dict, timeout: float) -> LLMResponse:
+        attempt_deadline = time.monotonic() + timeout
+        primary = _executor.submit(_timed_call, provider, operation, request, attempt_deadline)
+        pending = {primary}
+        try:
+            hedge_delay = hedge_delay_for(provider, operation, self.hedge_quantile) if self.hedging else None
+            if hedge_delay is not None and hedge_delay < timeout:
+                done, _ = wait(pending, timeout=hedge_delay)
+                if not done:
+                    metrics.llm_hedged_requests.inc(provider=provider.name, outcome="sent")
+                    pending.add(_executor.submit(_timed_call, provider, operation, request, attempt_deadline))
+
+            error = None
+            while pending:
+                remaining = attempt_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is not primary:
+                            metrics.llm_hedged_requests.inc(provider=provider.name, outcome="won")
+                        return future.result()
+                    error = error or future.exception()
+            if error is not None and not pending:
+                raise error
+            raise LLMTimeoutError(f"{provider.name}: no response within {timeout:.1f}s", provider.name)
+        finally:
+            # Calls still queued on the pool would otherwise run later for a
+            # caller that has moved on (retried, failed over or returned)
+            for future in pending:
+                future.cancel()
+
+
+# Recent successful call latencies per provider instance and operation,
+# shared by all clients so short-lived service objects still hedge with a
+# warm estimate. Operations are kept apart because their output lengths
+# (and so latencies) differ by an order of magnitude.
+_latencies: Dict[tuple, deque] = {}
+_latencies_lock = threading.Lock()
+
+
+def _provider_key(provider) -> tuple:
+    return (provider.name, provider.model, str(getattr(provider.client, "base_url", "")))
+
+
+def _timed_call(provider, operation: str, request: Dict, deadline: float) -> LLMResponse:
+    timeout = deadline - time.monotonic()
+    if timeout <= 0:
+        raise LLMTimeoutError(f"{provider.name}: attempt expired before it started", provider.name)
+    start = time.perf_counter()
+    try:
+        response = provider.complete(operation, timeout=timeout, **request)
+    except Exception as e:
+        raise classify_error(e, provider.name) from e
+    # Every completed attempt is billed, including hedges that lost the race
+    metrics.record_llm_usage(response.model, response.input_tokens, response.output_tokens)
+    with _latencies_lock:
+        samples = _latencies.setdefault(_provider_key(provider) + (operation,), deque(maxlen=LATENCY_WINDOW))
+        samples.append(time.perf_counter() - start)
+    return response
+
+
+_cooldown_until: Dict[tuple, float] = {}
+
+
+def _start_cooldown(provider):
+    with _latencies_lock:
+        _cooldown_until[_provider_key(provider)] = time.monotonic() + PROVIDER_COOLDOWN_SECONDS
+
+
+def _cooling_down(provider) -> bool:
+    with _latencies_lock:
+        return _cooldown_until.get(_provider_key(provider), 0.0) > time.monotonic()
+
+
+def hedge_delay_for(provider, operation: str, quantile: float = 0.95) -> Optional[float]:
+    """Recent latency quantile of operation on provider, or None while there are too few samples"""
+    with _latencies_lock:
+        samples = sorted(_latencies.get(_provider_key(provider) + (operation,), ()))
+    if len(samples) < MIN_HEDGE_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+
+
+def client_from_env(order: List[str] = None, api_keys: Dict[str, str] = None) -> ResilientLLMClient:
+    """ResilientLLMClient over every provider configured in the environment"""
+    return ResilientLLMClient(providers_from_env(order, api_keys))
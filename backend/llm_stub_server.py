@@ -0,0 +1,226 @@
+"""
+Fault-injecting stand-in for the Anthropic and OpenAI APIs
+llm_stub_server.py
+
+Serves POST /v1/messages (streaming and non-streaming) and
+POST /v1/chat/completions with configurable latency, slow tail, rate
+limiting and server errors, so the retry / hedging / failover behaviour of
+llm_client can be measured without spending tokens:
+
+python llm_stub_server.py --port 8100 --slow-prob 0.05 --error-prob 0.02
+ANTHROPIC_BASE_URL=http://127.0.0.1:8100 OPENAI_BASE_URL=http://127.0.0.1:8100/v1 \\
+ANTHROPIC_API_KEY=stub OPENAI_API_KEY=stub uvicorn main:app
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_TEXT = "This is a stub response from the {provider} test server."
+
+
+class FaultProfile:
+    """How one provider misbehaves; attributes can be changed while serving"""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.2, slow_prob: float = 0.0,
+                 slow_latency: float = 3.0, rate_limit_prob: float = 0.0, error_prob: float = 0.0,
+                 retry_after: float = 1.0, down: bool = False):
+        self.latency = latency              # median seconds before the response
+        self.jitter = jitter                # lognormal sigma around the median
+        self.slow_prob = slow_prob          # chance of an extra slow_latency stall
+        self.slow_latency = slow_latency
+        self.rate_limit_prob = rate_limit_prob
+        self.error_prob = error_prob
+        self.retry_after = retry_after      # Retry-After sent with 429s
+        self.down = down                    # answer every request with an error
+
+    def sample_latency(self) -> float:
+        latency = self.latency * random.lognormvariate(0, self.jitter) if self.jitter else self.latency
+        if random.random() < self.slow_prob:
+            latency += self.slow_latency
+        return latency
+
+    def sample_fault(self) -> str:
+        """'rate_limit', 'error' or None"""
+        if self.down:
+            return "error"
+        roll = random.random()
+        if roll < self.rate_limit_prob:
+            return "rate_limit"
+        if roll < self.rate_limit_prob + self.error_prob:
+            return "error"
+        return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "LLMStub/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path.endswith("/messages"):
+            provider = "anthropic"
+        elif self.path.endswith("/chat/completions"):
+            provider = "openai"
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+        profile = self.server.profiles[provider]
+        self.server.count(provider)
+        try:
+            fault = profile.sample_fault()
+            if fault is not None:
+                # Errors come back quickly, like real rate limiting / overload
+                time.sleep(min(profile.latency, 0.05))
+                self._send_fault(provider, fault, profile)
+                return
+
+            delay = profile.sample_latency()
+            if provider == "anthropic":
+                self._anthropic(body, delay)
+            else:
+                self._openai(body, delay)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up (e.g. the losing side of a hedged request)
+            pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_fault(self, provider: str, fault: str, profile: FaultProfile):
+        if fault == "rate_limit":
+            status, error_type, headers = 429, "rate_limit_error", {"retry-after": str(profile.retry_after)}
+        elif provider == "anthropic":
+            status, error_type, headers = 529, "overloaded_error", {}
+        else:
+            status, error_type, headers = 503, "server_error", {}
+        message = f"Injected {error_type} from stub server"
+        if provider == "anthropic":
+            payload = {"type": "error", "error": {"type": error_type, "message": message}}
+        else:
+            payload = {"error": {"type": error_type, "message": message, "code": None, "param": None}}
+        self._send_json(status, payload, headers)
+
+    def _anthropic(self, body: dict, delay: float):
+        model = body.get("model", "claude-stub")
+        text = STUB_TEXT.format(provider="anthropic")
+        input_tokens = len(json.dumps(body.get("messages", []))) // 4
+        output_tokens = len(text) // 4
+
+        if not body.get("stream"):
+            time.sleep(delay)
+            self._send_json(200, {
+                "id": "msg_stub", "type": "message", "role": "assistant", "model": model,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+            })
+            return
+
+        # Streamed: the delay is the time to first token
+        time.sleep(delay)
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        events = [
+            ("message_start", {"type": "message_start", "message": {
+                "id": "msg_stub", "type": "message", "role": "assistant", "model": model, "content": [],
+                "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": 1}}}),
+            ("content_block_start", {"type": "content_block_start", "index": 0,
+                                     "content_block": {"type": "text", "text": ""}}),
+            ("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                     "delta": {"type": "text_delta", "text": text}}),
+            ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+            ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                               "usage": {"output_tokens": output_tokens}}),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+        for event, data in events:
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+    def _openai(self, body: dict, delay: float):
+        text = STUB_TEXT.format(provider="openai")
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        time.sleep(delay)
+        self._send_json(200, {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "gpt-stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+                      "total_tokens": prompt_tokens + len(text) // 4},
+        })
+
+
+class StubServer(ThreadingHTTPServer):
+    """HTTP server with one FaultProfile per provider and request counters"""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), anthropic: FaultProfile = None, openai: FaultProfile = None):
+        super().__init__(address, StubHandler)
+        self.profiles = {"anthropic": anthropic or FaultProfile(), "openai": openai or FaultProfile()}
+        self.requests = {"anthropic": 0, "openai": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, provider: str):
+        with self._lock:
+            self.requests[provider] += 1
+
+    def start(self) -> "StubServer":
+        """Serve from a background thread (for use inside benchmarks)"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.2, help="median response time (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="lognormal sigma of the response time")
+    parser.add_argument("--slow-prob", type=float, default=0.0, help="probability of a slow response")
+    parser.add_argument("--slow-latency", type=float, default=3.0, help="extra delay of slow responses (s)")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="probability of a 429")
+    parser.add_argument("--error-prob", type=float, default=0.0, help="probability of a 529/503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429s (s)")
+    parser.add_argument("--down", choices=["anthropic", "openai"], action="append", default=[],
+                        help="fail every request to this provider")
+    args = parser.parse_args()
+
+    def profile(provider):
+        return FaultProfile(args.latency, args.jitter, args.slow_prob, args.slow_latency,
+                            args.rate_limit_prob, args.error_prob, args.retry_after,
+                            down=provider in args.down)
+
+    server = StubServer((args.host, args.port), profile("anthropic"), profile("openai"))
+    print(f"LLM stub server on {server.url} (Anthropic: {server.url}, OpenAI: {server.url}/v1)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Load test for request coalescing on the insights endpoints
+load_test_insights.py
+
+Fires bursts of concurrent requests at /api/insights and /api/insights/summary
+and reports how many computations and LLM calls actually ran:
+python load_test_insights.py [rows]
+
+The LLM is replaced by a local stub with a fixed delay, so no API key is
+needed and no tokens are spent.
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import ai_service
+import main
+
+LLM_DELAY_SECONDS = 1.0
+CLIENT_COUNTS = [1, 5, 10, 25, 50]
+
+
+class StubAIService:
+    """Stands in for FinancialAIService and counts summary calls"""
+
+    calls = 0
+    lock = threading.Lock()
+
+    def __init__(self, api_key: str = None):
+        pass
+
+    def generate_insights_summary(self, transactions, raise_errors: bool = False):
+        with StubAIService.lock:
+            StubAIService.calls += 1
+        time.sleep(LLM_DELAY_SECONDS)
+        return f"Summary of {len(transactions)} transactions"
+
+
+def make_transactions(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    categories = np.array(["Groceries", "Dining", "Shopping", "Utilities", "Health"], dtype=object)
+    return pd.DataFrame({
+        "date": pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 730, rows), "D"),
+        "description": "Store",
+        "amount": rng.exponential(60, rows).round(2),
+        "category": categories[rng.integers(0, len(categories), rows)],
+    })
+
+
+def executed_count(operation: str) -> float:
+    return main.metrics.singleflight_calls._values.get((operation, "executed"), 0.0)
+
+
+def burst(client: TestClient, path: str, clients: int):
+    """Send `clients` simultaneous requests and return (wall seconds, cpu seconds)"""
+    barrier = threading.Barrier(clients)
+
+    def request(_):
+        barrier.wait()
+        response = client.get(path)
+        assert response.status_code == 200, response.text
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(request, range(clients)))
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+def main_():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    ai_service.FinancialAIService = StubAIService
+    transactions = make_transactions(rows)
+
+    print("=" * 72)
+    print(f"Insights Coalescing Load Test ({rows:,} transactions)")
+    print("=" * 72)
+    print(f"{'endpoint':<24}{'clients':>8}{'computations':>14}{'LLM calls':>11}{'wall s':>9}{'CPU s':>9}")
+
+    with TestClient(main.app) as client:
+        for path, operation in [("/api/insights", "insights"), ("/api/insights/summary", "insights_summary")]:
+            for clients in CLIENT_COUNTS:
+                # New dataset version so every burst starts cold
+                main.store.replace(transactions)
+                before_executed, before_llm = executed_count(operation), StubAIService.calls
+
+                wall, cpu = burst(client, path, clients)
+
+                executed = executed_count(operation) - before_executed
+                llm_calls = StubAIService.calls - before_llm
+                print(f"{path:<24}{clients:>8}{executed:>14.0f}{llm_calls:>11}{wall:>9.2f}{cpu:>9.2f}")
+
+    print("\nComputations and LLM calls should stay at 1 per burst as clients increase.")
+
+
+if __name__ == "__main__":
+    main_()
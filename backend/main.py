@@ -5,18 +5,48 @@ main.py
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import pandas as pd
 from datetime import datetime
-import io
 import os
+import logging
 from dotenv import load_dotenv
 
+import metrics
+from csv_parser import parse_transactions_csv
+from categorizer import MerchantCategorizer
+from compression import CompressionMiddleware
+from export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, EXPORTERS, MAX_CHUNK_SIZE
+from llm_client import LLMError
+from models import init_db
+from query_tools import TransactionQueryTools
+from singleflight import SingleFlight
+from recurring import RecurringPaymentDetector, save_recurring_insights
+from shared_store import SharedTransactionStore
+from store import TransactionStore
+
+try:
+    # orjson serializes large JSON responses several times faster
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+    import orjson  # noqa: F401
+except ImportError:
+    from fastapi.responses import JSONResponse as FastJSONResponse
+
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(title="Financial Insights API")
+app = FastAPI(title="Financial Insights API", default_response_class=FastJSONResponse)
+logger = logging.getLogger(__name__)
+
+# Request latency histograms per route, exposed at /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# zstd / gzip compression of JSON and export responses
+if os.getenv("RESPONSE_COMPRESSION", "true").lower() in ("1", "true", "yes"):
+    app.add_middleware(CompressionMiddleware)
 
 # CORS middleware for React frontend
 app.add_middleware(
@@ -30,9 +60,10 @@ app.add_middleware(
 # Pydantic models for request/response
 class Transaction(BaseModel):
     date: str
-    description: str
+    # Blank in the uploaded CSV -> null
+    description: Optional[str] = None
     amount: float
-    category: str
+    category: Optional[str] = None
 
 class SpendingInsight(BaseModel):
     category: str
@@ -52,27 +83,85 @@ class InsightsResponse(BaseModel):
     anomalies: List[AnomalyAlert]
     monthly_average: float
 
-# In-memory storage (replace with database later)
-transactions_db: List[Transaction] = []
+class RecurringPayment(BaseModel):
+    merchant: str
+    category: Optional[str]
+    frequency: str
+    interval_days: float
+    amount: float
+    occurrences: int
+    first_date: str
+    last_date: str
+    next_expected_date: str
+
+# In-memory columnar storage (replace with database later). With
+# SHARED_STORE=true all uvicorn workers map one shared copy of the data.
+if os.getenv("SHARED_STORE", "false").lower() in ("1", "true", "yes"):
+    store = SharedTransactionStore(os.getenv("SHARED_STORE_DIR") or None)
+else:
+    store = TransactionStore()
+
+# Subscription / recurring charge detection, updated on every upload
+recurring_detector = RecurringPaymentDetector()
+
+# Concurrent identical requests for the same dataset version share one computation
+insights_flight = SingleFlight("insights")
+summary_flight = SingleFlight("insights_summary")
+recurring_flight = SingleFlight("recurring")
+
+# Fills in categories for bank exports that only have descriptions
+categorizer = MerchantCategorizer()
+
+@app.on_event("startup")
+def startup():
+    init_db()
 
 @app.get("/")
 def root():
     return {"message": "Financial Insights API", "version": "1.0.0"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus metrics (request latency, upload stages, LLM usage)"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+def _update_recurring(df: pd.DataFrame, new_version: int, append: bool):
+    version, frame = store.snapshot()
+    # df alone takes the detector forward only if no other upload landed
+    # after ours; otherwise the detector refits the current snapshot
+    appended = df if append and version == new_version else None
+    results = recurring_detector.sync(version, frame, appended)
+    if results is not None:
+        save_recurring_insights(results)
+
+def _refit_recurring(version: int, df: pd.DataFrame) -> pd.DataFrame:
+    results = recurring_detector.sync(version, df)
+    return recurring_detector.results if results is None else results
+
 @app.post("/api/upload")
-async def upload_csv(file: UploadFile = File(...)):
-    """Upload and process CSV file with financial transactions"""
+async def upload_csv(file: UploadFile = File(...), append: bool = False):
+    """Upload and process CSV file with financial transactions
+    
+    By default the upload replaces all stored transactions; with
+    append=true the rows are added to the existing ones.
+    """
     
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be a CSV")
     
     try:
+        stage = metrics.upload_stage_duration
+        
         # Read CSV
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        with stage.time(stage="read"):
+            contents = await file.read()
+        # Parses dates with the configured format hint as part of the read
+        with stage.time(stage="parse"):
+            df = await run_in_threadpool(parse_transactions_csv, contents)
         
-        # Validate required columns
-        required_columns = ['date', 'description', 'amount', 'category']
+        # Validate required columns (category is optional and inferred
+        # from the description when missing)
+        required_columns = ['date', 'description', 'amount']
         if not all(col in df.columns for col in required_columns):
             raise HTTPException(
                 status_code=400,
@@ -80,22 +169,33 @@ async def upload_csv(file: UploadFile = File(...)):
             )
         
         # Clean and process data
-        df['date'] = pd.to_datetime(df['date'])
         df['amount'] = df['amount'].abs()  # Ensure positive amounts
         
+        # Categorize rows without a category
+        if 'category' not in df.columns:
+            df['category'] = None
+        uncategorized = df['category'].isna()
+        if uncategorized.any():
+            with stage.time(stage="categorize"):
+                df['category'] = df['category'].astype(object)
+                # May call the LLM for unknown merchants, so keep it off the event loop
+                df.loc[uncategorized, 'category'] = await run_in_threadpool(
+                    categorizer.categorize, df.loc[uncategorized, 'description']
+                )
+        
         # Store in memory (replace with DB insert later)
-        transactions_db.clear()
-        for _, row in df.iterrows():
-            transactions_db.append(Transaction(
-                date=row['date'].strftime('%Y-%m-%d'),
-                description=row['description'],
-                amount=float(row['amount']),
-                category=row['category']
-            ))
+        with stage.time(stage="store"):
+            if append:
+                new_version = store.append(df)
+            else:
+                new_version = store.replace(df)
+        
+        with stage.time(stage="recurring"):
+            await run_in_threadpool(_update_recurring, df, new_version, append)
         
         return {
             "message": "File uploaded successfully",
-            "transactions_count": len(transactions_db)
+            "transactions_count": len(store)
         }
     
     except Exception as e:
@@ -104,24 +204,47 @@ async def upload_csv(file: UploadFile = File(...)):
 @app.get("/api/transactions", response_model=List[Transaction])
 def get_transactions(limit: int = 100):
     """Get all transactions"""
-    return transactions_db[:limit]
+    # Records come straight from the store, so skip response_model validation
+    return FastJSONResponse(store.to_records(limit))
+
+@app.get("/api/transactions/export")
+def export_transactions(format: str = "ndjson", chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Stream all transactions as NDJSON or CSV
+    
+    Rows are serialized a chunk at a time, so memory use stays constant
+    regardless of the number of transactions. chunk_size is capped at
+    MAX_CHUNK_SIZE to keep it that way.
+    """
+    
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {list(EXPORT_FORMATS)}")
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be positive")
+    chunk_size = min(chunk_size, MAX_CHUNK_SIZE)
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        EXPORTERS[format](store.frame, chunk_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions.{extension}"'}
+    )
 
 @app.get("/api/insights", response_model=InsightsResponse)
 def get_insights():
     """Generate financial insights from transactions"""
     
-    if not transactions_db:
+    version, df = store.snapshot()
+    if df.empty:
         raise HTTPException(status_code=400, detail="No transactions available")
     
-    # Convert to DataFrame for analysis
-    df = pd.DataFrame([t.dict() for t in transactions_db])
-    df['date'] = pd.to_datetime(df['date'])
-    
+    return insights_flight.do(version, _compute_insights, df)
+
+def _compute_insights(df: pd.DataFrame) -> InsightsResponse:
     # Calculate total spending
     total_spending = df['amount'].sum()
     
     # Top categories
-    category_totals = df.groupby('category')['amount'].sum().sort_values(ascending=False)
+    category_totals = df.groupby('category', observed=True)['amount'].sum().sort_values(ascending=False)
     top_categories = [
         SpendingInsight(
             category=cat,
@@ -137,7 +260,7 @@ def get_insights():
     std_amount = df['amount'].std()
     threshold = mean_amount + (2 * std_amount)
     
-    anomalies_df = df[df['amount'] > threshold]
+    anomalies_df = df[df['amount'] > threshold].head(5)  # Limit to top 5
     anomalies = [
         AnomalyAlert(
             date=row['date'].strftime('%Y-%m-%d'),
@@ -149,80 +272,127 @@ def get_insights():
     ]
     
     # Monthly average
-    df['month'] = df['date'].dt.to_period('M')
-    monthly_avg = df.groupby('month')['amount'].sum().mean()
+    months = df['date'].dt.to_period('M')
+    monthly_avg = df.groupby(months)['amount'].sum().mean()
     
     return InsightsResponse(
         total_spending=float(total_spending),
         top_categories=top_categories,
-        anomalies=anomalies[:5],  # Limit to top 5
+        anomalies=anomalies,
         monthly_average=float(monthly_avg)
     )
 
+@app.get("/api/insights/recurring", response_model=List[RecurringPayment])
+def get_recurring_payments():
+    """Get detected subscriptions and other recurring payments"""
+    
+    version, df = store.snapshot()
+    if df.empty:
+        raise HTTPException(status_code=400, detail="No transactions available")
+    
+    results = recurring_detector.results
+    if recurring_detector.version != version:
+        # Data was uploaded through another worker process
+        results = recurring_flight.do(version, _refit_recurring, version, df)
+    for column in ['first_date', 'last_date', 'next_expected_date']:
+        results = results.assign(**{column: pd.to_datetime(results[column]).dt.strftime('%Y-%m-%d')})
+    return results.to_dict('records')
+
 @app.get("/api/insights/summary")
 def get_ai_insights_summary():
     """Get AI-generated summary of financial insights"""
     
-    if not transactions_db:
+    version, df = store.snapshot()
+    if df.empty:
         raise HTTPException(status_code=400, detail="No transactions available")
     
     try:
-        from ai_service import FinancialAIService
-        ai_service = FinancialAIService()
-        
-        transactions_dict = [t.dict() for t in transactions_db]
-        summary = ai_service.generate_insights_summary(transactions_dict)
-        
-        return {
-            "summary": summary,
-            "generated_at": datetime.now().isoformat()
-        }
+        return summary_flight.do(version, _generate_ai_summary, df)
     
     except ImportError:
         return {
             "summary": "AI insights unavailable. Please configure ANTHROPIC_API_KEY.",
             "generated_at": datetime.now().isoformat()
         }
+    except LLMError as e:
+        # Shared with concurrent waiters but not kept as the version's
+        # summary, so the next request tries again
+        return {
+            "summary": f"Unable to generate AI summary: {str(e)}",
+            "generated_at": datetime.now().isoformat()
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
 
+def _generate_ai_summary(df: pd.DataFrame) -> dict:
+    from ai_service import FinancialAIService
+    ai_service = FinancialAIService()
+    
+    summary = ai_service.generate_insights_summary(df, raise_errors=True)
+    
+    return {
+        "summary": summary,
+        "generated_at": datetime.now().isoformat()
+    }
+
+# HTTP status for failed chats by FinancialAIService error_type
+CHAT_ERROR_STATUS = {
+    "timeout": 504,
+    "unavailable": 503,
+    "upstream": 502,
+}
+
 @app.post("/api/chat")
-async def chat_with_ai(query: str):
-    """Chat with AI about financial data"""
+async def chat_with_ai(query: str, tools: bool = False):
+    """Chat with AI about financial data
+    
+    With tools=true the model queries the transactions through local
+    aggregate functions instead of receiving a fixed data summary.
+    """
     
-    if not transactions_db:
+    if not len(store):
         raise HTTPException(status_code=400, detail="No transactions available")
     
     try:
-        # Check if API key is configured
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key or api_key == "your-key-here-replace-this":
+        # Initialize AI service (fails if no provider API key is configured)
+        from ai_service import FinancialAIService
+        try:
+            ai_service = FinancialAIService()
+        except ValueError as e:
             raise HTTPException(
                 status_code=500,
-                detail="ANTHROPIC_API_KEY not configured. Please add your API key to backend/.env file"
+                detail=f"{e}. Please add your API key to backend/.env file"
             )
         
-        # Initialize AI service
-        from ai_service import FinancialAIService
-        ai_service = FinancialAIService()
-        
-        # Convert transactions to dict format
-        transactions_dict = [t.dict() for t in transactions_db]
-        
-        # Get AI response
-        result = ai_service.chat(
-            user_query=query,
-            transactions=transactions_dict
-        )
+        if tools:
+            # Get AI response, answering from tool queries over the store
+            result = await run_in_threadpool(
+                ai_service.chat_with_tools,
+                user_query=query,
+                tools=TransactionQueryTools(store.frame)
+            )
+        else:
+            # Get AI response
+            result = await run_in_threadpool(
+                ai_service.chat,
+                user_query=query,
+                transactions=store.frame
+            )
         
         if not result["success"]:
-            raise HTTPException(status_code=500, detail=result["response"])
+            # Provider outages and timeouts are not server bugs: tell the
+            # client whether retrying later makes sense
+            status_code = CHAT_ERROR_STATUS.get(result.get("error_type"), 500)
+            headers = {"Retry-After": "5"} if status_code == 503 else None
+            raise HTTPException(status_code=status_code, detail=result["response"], headers=headers)
         
         return {
             "query": query,
             "response": result["response"],
             "model": result.get("model"),
-            "usage": result.get("usage")
+            "provider": result.get("provider"),
+            "usage": result.get("usage"),
+            "tool_calls": result.get("tool_calls")
         }
     
     except ImportError as e:
@@ -234,9 +404,7 @@ async def chat_with_ai(query: str):
         raise  # Re-raise HTTP exceptions
     except Exception as e:
         # Log the full error for debugging
-        print(f"Error in chat endpoint: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in chat endpoint: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"AI error: {str(e)}")
 
 if __name__ == "__main__":
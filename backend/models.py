@@ -33,12 +33,20 @@ class Insight(Base):
     __tablename__ = "insights"
     
     id = Column(Integer, primary_key=True, index=True)
-    insight_type = Column(String, nullable=False)  # 'anomaly', 'trend', 'forecast'
+    insight_type = Column(String, nullable=False)  # 'anomaly', 'trend', 'forecast', 'recurring'
     category = Column(String)
     description = Column(String, nullable=False)
     value = Column(Float)
     generated_at = Column(DateTime, default=datetime.utcnow)
 
+class MerchantCategory(Base):
+    __tablename__ = "merchant_categories"
+    
+    merchant_key = Column(String, primary_key=True)  # normalized merchant name
+    category = Column(String, nullable=False)
+    source = Column(String, nullable=False)  # 'llm'
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # Database setup
 DATABASE_URL = "sqlite:///./financial_insights.db"
 # For production, use PostgreSQL:
@@ -0,0 +1,179 @@
+"""
+Local query functions exposed to the LLM as tools
+query_tools.py
+"""
+
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+# Upper bound on rows returned by any tool, to keep tool results small
+MAX_RESULT_ROWS = 50
+
+_FILTER_PROPERTIES = {
+    "category": {
+        "type": "string",
+        "description": "Only include this spending category (case-insensitive)",
+    },
+    "start_date": {
+        "type": "string",
+        "description": "Only include transactions on or after this date (YYYY-MM-DD)",
+    },
+    "end_date": {
+        "type": "string",
+        "description": "Only include transactions on or before this date (YYYY-MM-DD)",
+    },
+    "description_contains": {
+        "type": "string",
+        "description": "Only include transactions whose description contains this text (case-insensitive), e.g. a merchant name",
+    },
+}
+
+TOOL_DEFINITIONS = [
+    {
+        "name": "get_dataset_overview",
+        "description": "Number of transactions, date range, total spending and the list of categories. Call this first to learn what data exists.",
+        "input_schema": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "sum_spending",
+        "description": "Total and count of matching transactions, optionally broken down by category, month or description.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                **_FILTER_PROPERTIES,
+                "group_by": {
+                    "type": "string",
+                    "enum": ["category", "month", "description"],
+                    "description": "Break the total down by this field (largest groups first)",
+                },
+            },
+        },
+    },
+    {
+        "name": "top_transactions",
+        "description": "Individual matching transactions, sorted by amount or date.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                **_FILTER_PROPERTIES,
+                "n": {
+                    "type": "integer",
+                    "description": f"Number of transactions to return (max {MAX_RESULT_ROWS})",
+                },
+                "order": {
+                    "type": "string",
+                    "enum": ["largest", "smallest", "most_recent", "oldest"],
+                    "description": "Sort order (default largest)",
+                },
+            },
+        },
+    },
+    {
+        "name": "monthly_series",
+        "description": "Spending total and transaction count per calendar month for matching transactions.",
+        "input_schema": {"type": "object", "properties": dict(_FILTER_PROPERTIES)},
+    },
+]
+
+
+def _round(value: float) -> float:
+    return round(float(value), 2)
+
+
+class TransactionQueryTools:
+    """Executes tool calls from the LLM against a transactions DataFrame"""
+
+    definitions = TOOL_DEFINITIONS
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    def execute(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a tool by name; errors are returned as {"error": ...}"""
+        handler = getattr(self, f"_tool_{name}", None)
+        if handler is None:
+            return {"error": f"Unknown tool: {name}"}
+        try:
+            return handler(**(arguments or {}))
+        except (TypeError, ValueError, KeyError) as e:
+            return {"error": str(e)}
+
+    def _filter(self, category: Optional[str] = None, start_date: Optional[str] = None,
+                end_date: Optional[str] = None, description_contains: Optional[str] = None) -> pd.DataFrame:
+        df = self.df
+        mask = pd.Series(True, index=df.index)
+        if category:
+            mask &= df['category'].str.lower() == category.lower()
+        if start_date:
+            mask &= df['date'] >= pd.Timestamp(start_date)
+        if end_date:
+            mask &= df['date'] <= pd.Timestamp(end_date)
+        if description_contains:
+            mask &= df['description'].str.contains(description_contains, case=False, regex=False, na=False)
+        return df[mask]
+
+    def _tool_get_dataset_overview(self) -> Dict[str, Any]:
+        df = self.df
+        if df.empty:
+            return {"transactions": 0}
+        return {
+            "transactions": len(df),
+            "first_date": df['date'].min().strftime('%Y-%m-%d'),
+            "last_date": df['date'].max().strftime('%Y-%m-%d'),
+            "total_spending": _round(df['amount'].sum()),
+            "categories": sorted(df['category'].dropna().unique().tolist()),
+        }
+
+    def _tool_sum_spending(self, group_by: Optional[str] = None, **filters) -> Dict[str, Any]:
+        df = self._filter(**filters)
+        result = {"total": _round(df['amount'].sum()), "count": len(df)}
+        if group_by:
+            if group_by == 'month':
+                keys = df['date'].dt.to_period('M')
+            elif group_by in ('category', 'description'):
+                keys = df[group_by]
+            else:
+                raise ValueError(f"Cannot group by '{group_by}'")
+            groups = df['amount'].groupby(keys, observed=True).agg(['sum', 'count']).sort_values('sum', ascending=False)
+            result["groups"] = [
+                {group_by: str(key), "total": _round(row['sum']), "count": int(row['count'])}
+                for key, row in groups.head(MAX_RESULT_ROWS).iterrows()
+            ]
+            result["group_count"] = len(groups)
+        return result
+
+    def _tool_top_transactions(self, n: int = 5, order: str = "largest", **filters) -> Dict[str, Any]:
+        df = self._filter(**filters)
+        n = max(1, min(int(n), MAX_RESULT_ROWS))
+        if order == "largest":
+            rows = df.nlargest(n, 'amount')
+        elif order == "smallest":
+            rows = df.nsmallest(n, 'amount')
+        elif order == "most_recent":
+            rows = df.nlargest(n, 'date')
+        elif order == "oldest":
+            rows = df.nsmallest(n, 'date')
+        else:
+            raise ValueError(f"Unknown order '{order}'")
+        return {
+            "matching": len(df),
+            "transactions": [
+                {
+                    "date": row.date.strftime('%Y-%m-%d'),
+                    "description": row.description,
+                    "amount": _round(row.amount),
+                    "category": row.category,
+                }
+                for row in rows.itertuples(index=False)
+            ],
+        }
+
+    def _tool_monthly_series(self, **filters) -> Dict[str, Any]:
+        df = self._filter(**filters)
+        months = df['amount'].groupby(df['date'].dt.to_period('M')).agg(['sum', 'count'])
+        series: List[Dict[str, Any]] = [
+            {"month": str(month), "total": _round(row['sum']), "count": int(row['count'])}
+            for month, row in months.tail(MAX_RESULT_ROWS).iterrows()
+        ]
+        return {"months": series}
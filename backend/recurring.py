@@ -0,0 +1,253 @@
+"""
+Recurring payment and subscription detection
+recurring.py
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from categorizer import normalize_merchant
+
+# name -> (period in days, tolerance in days, minimum number of charges)
+PERIODS = {
+    "weekly": (7, 1, 3),
+    "biweekly": (14, 2, 3),
+    "monthly": (30.4, 3.5, 3),
+    "quarterly": (91.3, 7, 3),
+    "annual": (365.25, 10, 2),
+}
+
+# A charge counts as "the same amount" if within 10% of the merchant median
+AMOUNT_TOLERANCE = 0.10
+# Share of intervals / amounts that must fit the pattern
+MIN_REGULARITY = 0.75
+
+RESULT_COLUMNS = [
+    'merchant', 'category', 'frequency', 'interval_days', 'amount',
+    'occurrences', 'first_date', 'last_date', 'next_expected_date',
+]
+
+
+class RecurringPaymentDetector:
+    """
+    Finds merchants charged at a regular interval with similar amounts
+
+    Transactions are reduced to three compact columns (merchant code, day
+    number, amount) and sorted by merchant then date, so detection is a single
+    O(n log n) sort followed by vectorized group statistics. The detector
+    keeps that history so appended transactions only require re-running
+    detection for the merchants they touch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Store version the results correspond to (see sync)
+        self.version = None
+        self._merchant_codes: Dict[str, int] = {}
+        self._merchant_labels: List[str] = []
+        self._merchant_categories: List[str] = []
+        self._merchant = np.empty(0, dtype=np.int32)
+        self._day = np.empty(0, dtype=np.int32)
+        self._amount = np.empty(0, dtype=np.float64)
+        self._results = pd.DataFrame(columns=RESULT_COLUMNS)
+
+    @property
+    def results(self) -> pd.DataFrame:
+        return self._results
+
+    def fit(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Detect recurring payments in df, discarding any previous history"""
+        with self._lock:
+            return self._fit(df)
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add newly appended transactions and re-evaluate affected merchants"""
+        with self._lock:
+            return self._update(df)
+
+    def sync(self, version: int, frame: pd.DataFrame,
+             appended: Optional[pd.DataFrame] = None) -> Optional[pd.DataFrame]:
+        """
+        Bring the results up to store version `version`, whose data is frame
+
+        `appended` are the rows that turned version - 1 into version; they are
+        applied incrementally when the detector is at version - 1, otherwise
+        frame is refit. The check and the update happen under one lock, so
+        concurrent uploads can't apply rows twice or out of order. Returns
+        the new results, or None if the detector is already at version or
+        newer.
+        """
+        with self._lock:
+            if self.version is not None and self.version >= version:
+                return None
+            if appended is not None and self.version == version - 1:
+                self._update(appended)
+            else:
+                self._fit(frame)
+            self.version = version
+            return self._results
+
+    def _fit(self, df: pd.DataFrame) -> pd.DataFrame:
+        self._reset()
+        merchant, day, amount = self._prepare(df)
+        self._merchant, self._day, self._amount = merchant, day, amount
+        self._results = self._detect(merchant, day, amount)
+        return self._results
+
+    def _update(self, df: pd.DataFrame) -> pd.DataFrame:
+        merchant, day, amount = self._prepare(df)
+        self._merchant = np.concatenate([self._merchant, merchant])
+        self._day = np.concatenate([self._day, day])
+        self._amount = np.concatenate([self._amount, amount])
+
+        affected = np.unique(merchant)
+        mask = np.isin(self._merchant, affected)
+        updated = self._detect(self._merchant[mask], self._day[mask], self._amount[mask])
+
+        affected_labels = [self._merchant_labels[code] for code in affected]
+        kept = self._results[~self._results['merchant'].isin(affected_labels)]
+        results = pd.concat([kept, updated], ignore_index=True) if len(kept) else updated
+        self._results = results.sort_values('amount', ascending=False, ignore_index=True)
+        return self._results
+
+    def _prepare(self, df: pd.DataFrame):
+        """Convert transactions to (merchant code, day number, amount) arrays"""
+        desc_codes, descriptions = pd.factorize(df['description'])
+        keys = normalize_merchant(pd.Series(descriptions, dtype=object)).tolist()
+        # Category of the most recent row per description (last write wins)
+        last_row = np.zeros(len(keys), dtype=np.int64)
+        last_row[desc_codes[desc_codes >= 0]] = np.flatnonzero(desc_codes >= 0)
+        categories = df['category'].take(last_row).to_numpy()
+
+        # Stable merchant codes across fit/update, assigned once per distinct description
+        code_by_description = np.empty(len(keys) + 1, dtype=np.int32)
+        code_by_description[-1] = -1  # NaN descriptions
+        for i, key in enumerate(keys):
+            if not key:
+                code_by_description[i] = -1
+                continue
+            code = self._merchant_codes.get(key)
+            if code is None:
+                code = len(self._merchant_labels)
+                self._merchant_codes[key] = code
+                self._merchant_labels.append(descriptions[i])
+                self._merchant_categories.append(categories[i])
+            else:
+                self._merchant_categories[code] = categories[i]
+            code_by_description[i] = code
+
+        merchant = code_by_description[desc_codes]
+        day = df['date'].values.astype('datetime64[D]').astype(np.int64).astype(np.int32)
+        amount = df['amount'].to_numpy(dtype=np.float64)
+
+        valid = merchant >= 0
+        return merchant[valid], day[valid], amount[valid]
+
+    def _detect(self, merchant: np.ndarray, day: np.ndarray, amount: np.ndarray) -> pd.DataFrame:
+        if len(merchant) < 2:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+
+        # Single sort by (merchant, day) packed into one int64 key
+        day_offset = day.astype(np.int64) - int(day.min())
+        order = np.argsort((merchant.astype(np.int64) << 32) | day_offset)
+        merchant, day, amount = merchant[order], day[order], amount[order]
+
+        # Contiguous segment per merchant
+        starts = np.flatnonzero(np.r_[True, merchant[1:] != merchant[:-1]])
+        counts = np.diff(np.r_[starts, len(merchant)])
+        stats = pd.DataFrame({
+            'occurrences': counts,
+            'first_day': day[starts],
+            'last_day': day[starts + counts - 1],
+        }, index=merchant[starts])
+
+        # Intervals between consecutive charges of the same merchant
+        same = merchant[1:] == merchant[:-1]
+        interval_merchant = merchant[1:][same]
+        interval = (day[1:] - day[:-1])[same]
+        stats['interval_days'] = pd.Series(interval).groupby(interval_merchant).median()
+        stats = stats[stats['occurrences'] >= 2]
+
+        # Assign each merchant the period its median interval falls into
+        stats['frequency'] = None
+        stats['period'] = np.nan
+        stats['tolerance'] = np.nan
+        for name, (period, tolerance, min_count) in PERIODS.items():
+            match = ((stats['interval_days'] - period).abs() <= tolerance) & (stats['occurrences'] >= min_count)
+            stats.loc[match, ['frequency', 'period', 'tolerance']] = [name, period, tolerance]
+        stats = stats[stats['frequency'].notna()]
+        if stats.empty:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+
+        # Amount statistics only for merchants with a periodic cadence
+        candidate = np.zeros(int(merchant.max()) + 1, dtype=bool)
+        candidate[stats.index] = True
+        rows = candidate[merchant]
+        merchant, amount = merchant[rows], amount[rows]
+        rows = candidate[interval_merchant]
+        interval_merchant, interval = interval_merchant[rows], interval[rows]
+        stats['amount'] = pd.Series(amount).groupby(merchant).median()
+
+        # Dense per-merchant lookups for the per-row regularity checks
+        size = len(candidate)
+        period_of = np.full(size, np.nan)
+        tolerance_of = np.full(size, np.nan)
+        median_amount_of = np.full(size, np.nan)
+        period_of[stats.index] = stats['period'].to_numpy(dtype=float)
+        tolerance_of[stats.index] = stats['tolerance'].to_numpy(dtype=float)
+        median_amount_of[stats.index] = stats['amount'].to_numpy(dtype=float)
+
+        interval_ok = np.abs(interval - period_of[interval_merchant]) <= tolerance_of[interval_merchant]
+        amount_ok = np.abs(amount - median_amount_of[merchant]) <= AMOUNT_TOLERANCE * median_amount_of[merchant]
+
+        stats['interval_regularity'] = pd.Series(interval_ok).groupby(interval_merchant).mean()
+        stats['amount_regularity'] = pd.Series(amount_ok).groupby(merchant).mean()
+        stats = stats[
+            (stats['interval_regularity'] >= MIN_REGULARITY)
+            & (stats['amount_regularity'] >= MIN_REGULARITY)
+        ]
+
+        epoch = np.datetime64('1970-01-01', 'D')
+        return pd.DataFrame({
+            'merchant': [self._merchant_labels[code] for code in stats.index],
+            'category': [self._merchant_categories[code] for code in stats.index],
+            'frequency': stats['frequency'].to_numpy(),
+            'interval_days': stats['interval_days'].to_numpy(dtype=float),
+            'amount': stats['amount'].to_numpy(dtype=float),
+            'occurrences': stats['occurrences'].to_numpy(dtype=int),
+            'first_date': epoch + stats['first_day'].to_numpy().astype('timedelta64[D]'),
+            'last_date': epoch + stats['last_day'].to_numpy().astype('timedelta64[D]'),
+            'next_expected_date': epoch + (
+                stats['last_day'].to_numpy() + np.round(stats['period'].to_numpy(dtype=float))
+            ).astype('timedelta64[D]'),
+        }).sort_values('amount', ascending=False, ignore_index=True)
+
+
+def save_recurring_insights(results: pd.DataFrame, session_factory: Callable = None):
+    """Replace the stored 'recurring' insights with the given detection results"""
+    from models import Insight, SessionLocal
+
+    db = (session_factory or SessionLocal)()
+    try:
+        db.query(Insight).filter(Insight.insight_type == "recurring").delete()
+        db.add_all([
+            Insight(
+                insight_type="recurring",
+                category=row.category,
+                description=(
+                    f"{row.merchant}: {row.frequency} charge of ${row.amount:.2f} "
+                    f"({row.occurrences} payments, next expected {row.next_expected_date:%Y-%m-%d})"
+                ),
+                value=float(row.amount),
+            )
+            for row in results.itertuples(index=False)
+        ])
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,190 @@
+"""
+Transaction store shared between worker processes via memory-mapped files
+shared_store.py
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from store import COLUMNS, TransactionStore, empty_frame
+
+ALIGNMENT = 64
+_GENERATION = struct.Struct("<q")
+
+
+def default_directory() -> str:
+    # tmpfs on Linux, so the data files never touch disk
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "financial-insights")
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _write_generation_file(path: str, df: pd.DataFrame):
+    """
+    Write df as a self-describing columnar file:
+    [8-byte header length][JSON header][64-byte aligned column arrays]
+
+    Dates and amounts are stored as raw int64 / float64 arrays; descriptions
+    and categories as dictionary codes plus one UTF-8 string blob, so readers
+    only materialize one Python string per distinct value.
+    """
+    arrays = []  # (name, ndarray)
+    header = {"rows": len(df), "columns": {}}
+
+    arrays.append(("date", df['date'].to_numpy(dtype='datetime64[ns]').view(np.int64)))
+    arrays.append(("amount", df['amount'].to_numpy(dtype=np.float64)))
+    for column in ('description', 'category'):
+        values = pd.Categorical(df[column])
+        strings = [str(value) for value in values.categories]
+        char_offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in strings], out=char_offsets[1:])
+        arrays.append((f"{column}.codes", values.codes))
+        arrays.append((f"{column}.offsets", char_offsets))
+        arrays.append((f"{column}.strings", np.frombuffer("".join(strings).encode('utf-8'), dtype=np.uint8)))
+
+    # Lay out arrays after a generously sized header
+    header_json = json.dumps(header)
+    offset = _aligned(8 + len(header_json) + 200 * len(arrays))
+    for name, array in arrays:
+        header["columns"][name] = {"dtype": array.dtype.str, "count": len(array), "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_GENERATION.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays:
+            f.seek(header["columns"][name]["offset"])
+            f.write(np.ascontiguousarray(array).data)
+        f.truncate(max(offset, 8 + len(header_bytes)))
+    os.replace(tmp_path, path)
+
+
+def _map_generation_file(path: str) -> pd.DataFrame:
+    """Map a generation file and build a DataFrame over it without copying"""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (header_length,) = _GENERATION.unpack_from(mapped, 0)
+    header = json.loads(mapped[8:8 + header_length].decode('utf-8'))
+
+    def array(name):
+        spec = header["columns"][name]
+        return np.frombuffer(mapped, dtype=np.dtype(spec["dtype"]), count=spec["count"], offset=spec["offset"])
+
+    def categorical(column):
+        text = array(f"{column}.strings").tobytes().decode('utf-8')
+        offsets = array(f"{column}.offsets")
+        categories = pd.Index([text[start:end] for start, end in zip(offsets[:-1], offsets[1:])], dtype=object)
+        return pd.Categorical.from_codes(array(f"{column}.codes"), categories=categories, validate=False)
+
+    # Build in COLUMNS order directly: selecting columns afterwards would copy
+    columns = {
+        'date': array("date").view('datetime64[ns]'),
+        'description': categorical('description'),
+        'amount': array("amount"),
+        'category': categorical('category'),
+    }
+    return pd.DataFrame({name: columns[name] for name in COLUMNS}, copy=False)
+
+
+class SharedTransactionStore(TransactionStore):
+    """
+    TransactionStore whose data lives in memory-mapped files shared by all
+    worker processes (e.g. `uvicorn main:app --workers N`)
+
+    Each upload publishes a new generation file and bumps a generation
+    counter in a small shared control file. Every worker maps the current
+    generation read-only, so memory stays close to one copy of the data
+    regardless of the number of workers, and checks the counter on each
+    access to pick up uploads made by other workers. `version` is the
+    generation number, so it is identical across workers.
+    """
+
+    def __init__(self, directory: str = None):
+        super().__init__()
+        self.directory = directory or default_directory()
+        os.makedirs(self.directory, exist_ok=True)
+
+        control_path = os.path.join(self.directory, "generation")
+        with self._file_lock():
+            if not os.path.exists(control_path) or os.path.getsize(control_path) < _GENERATION.size:
+                with open(control_path, "wb") as f:
+                    f.write(_GENERATION.pack(0))
+        with open(control_path, "r+b") as f:
+            self._control = mmap.mmap(f.fileno(), _GENERATION.size)
+
+    def _path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"transactions-{generation}.bin")
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize writers across processes"""
+        import fcntl
+
+        with open(os.path.join(self.directory, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _current_generation(self) -> int:
+        return _GENERATION.unpack_from(self._control, 0)[0]
+
+    def snapshot(self) -> Tuple[int, pd.DataFrame]:
+        generation = self._current_generation()
+        with self._lock:
+            if generation != self._version:
+                self._load(generation)
+            return self._version, self._frame
+
+    def _load(self, generation: int):
+        while generation != self._version:
+            if generation == 0:
+                frame = empty_frame()
+            else:
+                try:
+                    frame = _map_generation_file(self._path(generation))
+                except FileNotFoundError:
+                    # Superseded and removed between reading the counter and
+                    # opening the file: retry with the newer generation
+                    generation = self._current_generation()
+                    continue
+            # Old mappings are released once the last frame using them is gone
+            self._frame, self._version = frame, generation
+
+    def _publish(self, df: pd.DataFrame) -> int:
+        """Write df as the next generation (caller holds the file lock)"""
+        generation = self._current_generation() + 1
+        _write_generation_file(self._path(generation), df)
+        _GENERATION.pack_into(self._control, 0, generation)
+
+        for name in os.listdir(self.directory):
+            if name.startswith("transactions-") and name != os.path.basename(self._path(generation)):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+        return generation
+
+    def replace(self, df: pd.DataFrame) -> int:
+        with self._file_lock():
+            return self._publish(df)
+
+    def append(self, df: pd.DataFrame) -> int:
+        with self._file_lock():
+            _, current = self.snapshot()
+            return self._publish(pd.concat([current, df[COLUMNS]], ignore_index=True) if len(current) else df)
@@ -0,0 +1,70 @@
+"""
+Single-flight request coalescing
+singleflight.py
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is in progress wait and receive the same result (or exception). The
+    most recent successful result is also kept, so stragglers queued behind
+    the server's worker threads don't recompute it. Keys must therefore
+    include whatever identifies the input (e.g. the dataset version), and
+    functions must raise on failure rather than return a fallback value,
+    which would be kept as the result for the key.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._last_key: Hashable = None
+        self._last_result: Any = None
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            finished = self._last_key == key
+            last_result = self._last_result
+            call = self._calls.get(key)
+            leader = not finished and call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            metrics.singleflight_calls.inc(operation=self.name, role="shared")
+            if finished:
+                return last_result
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.singleflight_calls.inc(operation=self.name, role="executed")
+        try:
+            call.result = fn(*args, **kwargs)
+            with self._lock:
+                self._last_key, self._last_result = key, call.result
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,78 @@
+"""
+In-memory columnar transaction storage
+store.py
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+COLUMNS = ['date', 'description', 'amount', 'category']
+
+
+def empty_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        'date': pd.Series(dtype='datetime64[ns]'),
+        'description': pd.Series(dtype=object),
+        'amount': pd.Series(dtype='float64'),
+        'category': pd.Series(dtype=object),
+    })
+
+
+class TransactionStore:
+    """
+    Holds all transactions as a single DataFrame
+
+    Writers swap in a new frame rather than mutating the current one, so
+    readers can use `frame` without locking. `version` increases on every
+    write and identifies the dataset a computation was based on.
+    """
+
+    def __init__(self):
+        self._frame = empty_frame()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Current snapshot of all transactions (treat as read-only)"""
+        return self.snapshot()[1]
+
+    @property
+    def version(self) -> int:
+        return self.snapshot()[0]
+
+    def snapshot(self) -> Tuple[int, pd.DataFrame]:
+        """Current (version, frame) pair, read consistently"""
+        with self._lock:
+            return self._version, self._frame
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def replace(self, df: pd.DataFrame) -> int:
+        """Replace all transactions with df and return the new version"""
+        frame = df[COLUMNS].reset_index(drop=True)
+        with self._lock:
+            self._frame = frame
+            self._version += 1
+            return self._version
+
+    def append(self, df: pd.DataFrame) -> int:
+        """Add the transactions in df after the existing ones and return the new version"""
+        with self._lock:
+            if len(self._frame):
+                frame = pd.concat([self._frame, df[COLUMNS]], ignore_index=True)
+            else:
+                frame = df[COLUMNS].reset_index(drop=True)
+            self._frame = frame
+            self._version += 1
+            return self._version
+
+    def to_records(self, limit: Optional[int] = None) -> List[Dict]:
+        """Transactions as dicts with ISO formatted dates"""
+        df = self.frame if limit is None else self.frame.head(limit)
+        records = df.assign(date=df['date'].dt.strftime('%Y-%m-%d')).astype(object)
+        # Missing values as None so they serialize as JSON null
+        return records.where(records.notna(), None).to_dict('records')
@@ -0,0 +1,122 @@
+"""
+Test script for recurring payment detection
+test_recurring.py
+
+Runs without a database or API key:
+python test_recurring.py
+"""
+
+import pandas as pd
+
+from recurring import RecurringPaymentDetector
+from store import TransactionStore
+
+
+def monthly_charges(description, amount: float, months: int, start: str = "2024-01-15") -> pd.DataFrame:
+    """`months` monthly charges; description may be a callable of the month index"""
+    dates = pd.date_range(start, periods=months, freq="MS") + pd.Timedelta(days=14)
+    return pd.DataFrame({
+        "date": dates,
+        "description": [description(i) if callable(description) else description for i in range(months)],
+        "amount": amount,
+        "category": "Entertainment",
+    })
+
+
+def test_varying_reference_codes():
+    """Card statements append a per-transaction code; it must not split the merchant"""
+
+    codes = ["P4E28A851D", "P9C01B77E2", "P1F3D0A4C6", "P7A2E9B310", "P5D8C6F0A1", "P3B4A1E8D9"]
+    df = monthly_charges(lambda i: f"SPOTIFY {codes[i]}", 9.99, len(codes))
+
+    results = RecurringPaymentDetector().fit(df)
+
+    assert len(results) == 1, results
+    assert results.loc[0, "merchant"].startswith("SPOTIFY")
+    assert results.loc[0, "frequency"] == "monthly"
+    assert results.loc[0, "occurrences"] == len(codes)
+    print(f"✅ {len(codes)} 'SPOTIFY <code>' charges detected as one monthly payment")
+
+
+class _RacingDetector(RecurringPaymentDetector):
+    """Runs `interleave` once, on entry to the next call that applies results:
+    after the caller has read the store, before it holds the detector lock"""
+
+    interleave = None
+
+    def _maybe_interleave(self):
+        interleave, self.interleave = self.interleave, None
+        if interleave is not None:
+            interleave()
+
+    def sync(self, *args, **kwargs):
+        self._maybe_interleave()
+        return super().sync(*args, **kwargs)
+
+    def fit(self, df):
+        self._maybe_interleave()
+        return super().fit(df)
+
+    def update(self, df):
+        self._maybe_interleave()
+        return super().update(df)
+
+
+def test_interleaved_appends():
+    """
+    Two concurrent appends must give the same results as a fresh fit of the
+    final data, whatever order their detector updates run in (no rows
+    applied twice, none lost)
+    """
+    import main
+
+    base = monthly_charges("NETFLIX.COM", 15.99, 6)
+    first = monthly_charges("SPOTIFY", 9.99, 6)
+    second = monthly_charges("NETFLIX.COM", 15.99, 6, start="2024-07-15")
+
+    def append(df):
+        main._update_recurring(df, main.store.append(df), append=True)
+
+    def race():
+        # Second upload lands entirely inside the first one's update
+        new_version = main.store.append(first)
+        main.recurring_detector.interleave = lambda: append(second)
+        main._update_recurring(first, new_version, append=True)
+
+    def delayed_update():
+        # Both appends are stored before either detector update runs
+        versions = [main.store.append(first), main.store.append(second)]
+        main._update_recurring(second, versions[1], append=True)
+        main._update_recurring(first, versions[0], append=True)
+
+    def sequential():
+        append(first)
+        append(second)
+
+    scenarios = {"race": race, "delayed update": delayed_update, "sequential": sequential}
+    saved = main.store, main.recurring_detector, main.save_recurring_insights
+    try:
+        main.save_recurring_insights = lambda results: None
+        for name, scenario in scenarios.items():
+            main.store, main.recurring_detector = TransactionStore(), _RacingDetector()
+            main._update_recurring(base, main.store.replace(base), append=False)
+
+            scenario()
+
+            expected = RecurringPaymentDetector().fit(main.store.frame)
+            actual = main.recurring_detector.results
+            assert main.recurring_detector.version == main.store.version, name
+            assert dict(zip(actual['merchant'], actual['occurrences'])) == \
+                dict(zip(expected['merchant'], expected['occurrences'])), (name, actual, expected)
+    finally:
+        main.store, main.recurring_detector, main.save_recurring_insights = saved
+    print(f"✅ {len(scenarios)} interleavings of two appends match a fresh fit")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Recurring Payment Detection Tests")
+    print("=" * 50 + "\n")
+
+    test_varying_reference_codes()
+    test_interleaved_appends()